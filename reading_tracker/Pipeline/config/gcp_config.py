@@ -3,8 +3,108 @@
 
 import os
 import json
+import threading
+import time
 from pathlib import Path
 
+class SecretProvider:
+    """Secrets from files mounted in secrets_dir (or environment variables), read once and kept in memory
+    
+    A background thread stats the mounted files every poll_interval seconds and
+    re-reads a file only when its mtime or inode changes, which is how Cloud Run
+    presents a rotated secret. Changed values replace the whole set in one
+    assignment and the on_change callbacks get {name: new value}, so readers
+    never see a half-rotated set and never touch the filesystem.
+    """
+    
+    def __init__(self, secrets_dir, poll_interval=30):
+        self.secrets_dir = Path(secrets_dir)
+        self.poll_interval = poll_interval
+        self._values = {}
+        self._versions = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = False
+        self.file_reads = 0
+        self.rotations = 0
+        # Threads don't survive fork: gunicorn workers restart the poller
+        os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _version(self, name):
+        try:
+            stat = (self.secrets_dir / name).stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino
+    
+    def _read(self, name):
+        """(value, file version) from the mounted file, else from the environment"""
+        version = self._version(name)
+        if version is not None:
+            try:
+                value = (self.secrets_dir / name).read_text().strip()
+                self.file_reads += 1
+                return value, version
+            except OSError as e:
+                print(f"Warning: Could not read secret file {self.secrets_dir / name}: {e}")
+        return os.environ.get(name.upper().replace('-', '_')), version
+    
+    def get(self, name, default=None):
+        values = self._values
+        if name not in values:
+            with self._lock:
+                if name not in self._values:
+                    value, self._versions[name] = self._read(name)
+                    if value is None and default is None:
+                        print(f"Warning: Secret {name} not found in files or environment")
+                    self._values = {**self._values, name: value}
+                values = self._values
+        value = values[name]
+        return default if value is None else value
+    
+    def check(self):
+        """Re-read the secrets whose files changed; returns {name: new value}"""
+        changed = {}
+        with self._lock:
+            for name, version in list(self._versions.items()):
+                if self._version(name) == version:
+                    continue
+                value, self._versions[name] = self._read(name)
+                if value != self._values.get(name):
+                    changed[name] = value
+            if changed:
+                self._values = {**self._values, **changed}
+                self.rotations += len(changed)
+        if changed:
+            for callback in self._callbacks:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    print(f"Warning: Secret rotation callback failed: {e}")
+        return changed
+    
+    def on_change(self, callback):
+        self._callbacks.append(callback)
+    
+    def start(self):
+        """Start polling the mounted files (no-op without a poll interval)"""
+        self._started = True
+        if self.poll_interval and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._poll, name='secret-poller', daemon=True)
+            self._thread.start()
+    
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.check()
+    
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        if self._started:
+            self.start()
+
 class GCPConfig:
     """Configuration class for GCP deployment"""
     
@@ -13,28 +113,16 @@ class GCPConfig:
     ENVIRONMENT = os.environ.get('FLASK_ENV', 'production')
     DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
     
-    # Secret management - secrets are mounted as files in Cloud Run
+    # Secret management - secrets are mounted as files in Cloud Run, read once
+    # and re-read only when a file changes (checked every SECRET_POLL_SECONDS)
     SECRETS_DIR = Path('/secrets')
+    SECRET_POLL_SECONDS = int(os.environ.get('SECRET_POLL_SECONDS', 30))
+    secrets = SecretProvider(SECRETS_DIR, SECRET_POLL_SECONDS)
     
     @classmethod
     def get_secret(cls, secret_name, default=None):
-        """Read secret from mounted file or environment variable"""
-        # Try to read from mounted secret file first (Cloud Run with secrets)
-        secret_file = cls.SECRETS_DIR / secret_name
-        if secret_file.exists():
-            try:
-                return secret_file.read_text().strip()
-            except Exception as e:
-                print(f"Warning: Could not read secret file {secret_file}: {e}")
-        
-        # Fallback to environment variable
-        env_var = secret_name.upper().replace('-', '_')
-        value = os.environ.get(env_var, default)
-        
-        if value is None:
-            print(f"Warning: Secret {secret_name} not found in files or environment")
-        
-        return value
+        """Secret from the mounted file or environment variable, served from memory"""
+        return cls.secrets.get(secret_name, default)
     
     # Application secrets - initialized at class level
     def __init__(self):
@@ -42,12 +130,13 @@ class GCPConfig:
     
     @classmethod
     def get_config_dict(cls):
-        """Get configuration as a dictionary for Flask"""
+        """Get configuration as a dictionary for Flask (secrets come from memory, so this is cheap)"""
         config = {}
-        config['SECRET_KEY'] = cls.get_secret(cls, 'secret-key') or os.environ.get('SECRET_KEY', 'dev-key-change-me')
-        config['GOOGLE_CLIENT_ID'] = cls.get_secret(cls, 'google-client-id') or os.environ.get('GOOGLE_CLIENT_ID')
-        admin_emails_str = cls.get_secret(cls, 'admin-emails', '') or os.environ.get('ADMIN_EMAILS', '')
+        config['SECRET_KEY'] = cls.get_secret('secret-key') or os.environ.get('SECRET_KEY', 'dev-key-change-me')
+        config['GOOGLE_CLIENT_ID'] = cls.get_secret('google-client-id') or os.environ.get('GOOGLE_CLIENT_ID')
+        admin_emails_str = cls.get_secret('admin-emails', '') or os.environ.get('ADMIN_EMAILS', '')
         config['ADMIN_EMAILS'] = [email.strip() for email in admin_emails_str.split(',') if email.strip()]
+        config['METRICS_TOKEN'] = cls.get_secret('metrics-token', '') or None
         return config
     
     # Database configuration
@@ -74,6 +163,9 @@ class GCPConfig:
     # Logging configuration
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     
+    # Share of requests timed for the Server-Timing header and timing log entries (0 to 1)
+    REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 0.01))
+    
     # Health check configuration
     HEALTH_CHECK_PATH = '/health'
     
@@ -95,15 +187,16 @@ class GCPConfig:
         return "http://localhost:8080"
     
     @classmethod
-    def validate_config(cls):
+    def validate_config(cls, config=None):
         """Validate that required configuration is present"""
         errors = []
+        config = config or cls.get_config_dict()
         
-        secret_key = cls.get_secret(cls, 'secret-key') or os.environ.get('SECRET_KEY', 'dev-key-change-me')
+        secret_key = config['SECRET_KEY']
         if not secret_key or secret_key == 'dev-key-change-me':
             errors.append("SECRET_KEY must be set to a secure value")
         
-        google_client_id = cls.get_secret(cls, 'google-client-id') or os.environ.get('GOOGLE_CLIENT_ID')
+        google_client_id = config['GOOGLE_CLIENT_ID']
         if not google_client_id:
             errors.append("GOOGLE_CLIENT_ID must be set for OAuth authentication")
         
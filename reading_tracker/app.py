@@ -1,16 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, session, flash, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from sqlalchemy import and_, case, event, cast, func, insert, literal, null, or_, select, union_all
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
 import os
 from datetime import datetime, timedelta, timezone
 import json
+import logging
+import math
 import random
-from dotenv import load_dotenv
+from collections import namedtuple
+from dataclasses import dataclass
 from config import Config, DevelopmentConfig, ProductionConfig, AzureConfig
+from cache import UserCache, SQLiteCacheBackend
+from events import EventBroker
+from instrumentation import QueryCounter, LazyLoadGuard, RequestTimer
+from metrics import Metrics
+from group_commit import GroupCommitWriter
+from db_routing import DatabaseRouter, RoutingSession, read_only_view, use_primary
+from google_verifier import GoogleTokenVerifier
+from book_search import ensure_fulltext_catalog, ensure_search_index, rebuild_search_index, search_books, parse_search_cursor
+from fast_start import ensure_schema, load_environment, setup_json_logging
+from roles import RoleResolver
+from snapshot import LeaderboardSnapshot
 
-load_dotenv()
+load_environment()
 
 def create_app():
     app = Flask(__name__)
@@ -23,15 +39,85 @@ def create_app():
     else:
         app.config.from_object(DevelopmentConfig)
     
+    # Nothing else configures logging under gunicorn, and Python's fallback
+    # handler drops INFO records such as the request timing lines
+    level = getattr(logging, app.config['LOG_LEVEL'])
+    if app.config['LOG_FORMAT'] == 'json':
+        setup_json_logging(level)
+    else:
+        logging.basicConfig(level=level)
+    
     return app
 
 app = create_app()
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+# SQLite connection pragmas, and the read replica or read-only pool for read-only views
+db_router = DatabaseRouter(app, db)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Per-user page cache, invalidated by the routes that change the cached data.
+# 'active' is the active session registry: start/stop write it directly with put()
+USER_CACHE_NAMES = ('dashboard', 'study', 'study_stats', 'books', 'book_count', 'stats', 'active')
+user_cache = UserCache(
+    USER_CACHE_NAMES,
+    maxsize=app.config.get('USER_CACHE_SIZE', 2048),
+    backend=SQLiteCacheBackend(app.config['USER_CACHE_BACKEND']) if app.config.get('USER_CACHE_BACKEND') else None
+)
+
+# After a write, all of a user's devices read from the primary until the replica has it
+# (from the Flask-Login cookie: the lookup runs while a query picks its engine)
+db_router.track_writers(user_cache, writer_id=lambda: session.get('_user_id'))
+
+# Who is logged in, so Flask-Login doesn't look the user up on every request.
+# The admin routes invalidate it through the shared generations when there is a
+# backend; the ttl bounds staleness from changes made anywhere else
+identity_cache = UserCache(
+    ('identity',),
+    maxsize=app.config.get('USER_IDENTITY_CACHE_SIZE', 4096),
+    backend=user_cache.backend,
+    ttl=app.config.get('USER_IDENTITY_TTL') or (300 if user_cache.backend is not None else 5)
+)
+
+# X-DB-Queries header and per-endpoint query counts
+query_counter = QueryCounter(app)
+
+# Flags N+1 lazy loading (on in development; LAZY_LOAD_LIMIT elsewhere)
+lazy_load_guard = LazyLoadGuard(app)
+
+# Server-Timing header and a timing log line for a sample of requests
+request_timer = RequestTimer(app)
+
+# Checks Google sign-in tokens against locally cached signing certificates
+google_verifier = GoogleTokenVerifier(app.config.get('GOOGLE_CLIENT_ID'))
+
+# Who gets which role at sign-up, parsed once from ADMIN_EMAILS. Unlike app_gcp.py,
+# which rebuilds it when the admin-emails secret rotates, this app has no config
+# reload: the environment is fixed for the life of the process, so restart to change it
+role_resolver = RoleResolver({'admin': os.environ.get('ADMIN_EMAILS', '')})
+
+# Batches study start/stop writes from concurrent requests into shared transactions
+group_writer = GroupCommitWriter(
+    app, db,
+    max_delay=app.config.get('GROUP_COMMIT_DELAY_MS', 5) / 1000,
+    max_batch=app.config.get('GROUP_COMMIT_MAX_BATCH', 64)
+)
+
+# Pushes study session changes to every tab a user has open
+study_events = EventBroker(max_streams=app.config.get('SSE_MAX_STREAMS', 4))
+
+# Prometheus metrics for /metrics, summed across gunicorn workers with PROMETHEUS_MULTIPROC_DIR
+metrics = Metrics(
+    app,
+    engines={'primary': lambda: db.engine, 'reader': lambda: db_router.reader},
+    caches={'user_cache': user_cache, 'identity_cache': identity_cache},
+    active_sessions=lambda: db.session.query(func.count(StudySession.id))
+        .filter(StudySession.end_time.is_(None)).scalar()
+)
+
 # Models
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -54,6 +140,10 @@ class Book(db.Model):
     date_read = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+# The library pages walk (user_id, date_read); duplicate-title checks and title sorts use the second
+db.Index('idx_book_user_date', Book.user_id, Book.date_read.desc())
+db.Index('idx_book_user_title', Book.user_id, Book.title)
+
 class StudySession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(50), nullable=False)  # maths, english, reading, science, writing, social_studies
@@ -66,9 +156,557 @@ class StudySession(db.Model):
     
     book = db.relationship('Book', backref='study_sessions', lazy=True)
 
+# Study history pages by user, and the "today" feed on the leaderboard by time range
+db.Index('idx_session_user_start', StudySession.user_id, StudySession.start_time.desc())
+db.Index('idx_session_start', StudySession.start_time)
+
+# At most one open session per user, so this stays tiny however long the session history grows.
+# Only the configured backend's option is declared: each dialect named here is imported at startup
+PARTIAL_INDEX_BACKENDS = ('sqlite', 'postgresql', 'mssql')
+database_backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+active_session_index = db.Index(
+    'idx_study_session_active', StudySession.user_id,
+    **({f'{database_backend}_where': StudySession.end_time.is_(None)}
+       if database_backend in PARTIAL_INDEX_BACKENDS else {})
+)
+
+class UserStudyTotals(db.Model):
+    """Running per-user study totals, updated whenever a session is closed"""
+    __tablename__ = 'user_study_totals'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_minutes = db.Column(db.Integer, default=0, nullable=False)
+    session_count = db.Column(db.Integer, default=0, nullable=False)
+    last_session_at = db.Column(db.DateTime)
+    
+    user = db.relationship('User', backref=db.backref('study_totals', uselist=False, cascade='all, delete-orphan'))
+
+# Leaderboard reads walk this index instead of aggregating study_session
+db.Index('idx_totals_minutes', UserStudyTotals.total_minutes.desc(), UserStudyTotals.user_id)
+
+class UserSubjectTotals(db.Model):
+    """Running study totals per user and subject, for subject leaderboards and breakdowns"""
+    __tablename__ = 'user_subject_totals'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    subject = db.Column(db.String(50), primary_key=True)
+    total_minutes = db.Column(db.Integer, default=0, nullable=False)
+    session_count = db.Column(db.Integer, default=0, nullable=False)
+    last_session_at = db.Column(db.DateTime)
+    
+    user = db.relationship('User', backref=db.backref('subject_totals', lazy=True, cascade='all, delete-orphan'))
+
+# "Top N for subject X" is a prefix range of this index
+db.Index('idx_subject_totals_minutes', UserSubjectTotals.subject,
+         UserSubjectTotals.total_minutes.desc(), UserSubjectTotals.user_id)
+
+class StudyRollup(db.Model):
+    """Minutes per UTC day, user and subject; time-windowed leaderboards sum a range of these"""
+    __tablename__ = 'study_rollup'
+    bucket_date = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    subject = db.Column(db.String(50), primary_key=True)
+    total_minutes = db.Column(db.Integer, default=0, nullable=False)
+    session_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    user = db.relationship('User', backref=db.backref('study_rollups', lazy=True, cascade='all, delete-orphan'))
+
+@event.listens_for(db.metadata, 'after_create')
+def create_missing_indexes(target, connection, **kw):
+    """create_all only indexes the tables it creates; add declared indexes missing from older tables"""
+    for table in target.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+@event.listens_for(db.metadata, 'after_create')
+def create_book_search_index(target, connection, **kw):
+    """Add the full-text index for book search whenever the schema is created"""
+    if ensure_search_index(connection):
+        rebuild_search_index(connection)
+
+def create_tables():
+    """create_all(), then the SQL Server full-text index, which can't be created inside its transaction"""
+    db.create_all()
+    ensure_fulltext_catalog(db.engine)
+
+def to_utc_naive(value):
+    """Normalize a datetime to naive UTC, which is what the DateTime columns hold"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def utc_day_range(day):
+    """[start, end) naive UTC datetimes for a calendar day, so start_time filters can use an index"""
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
+def add_session_minutes(model, key, minutes, finished_at=None):
+    """Add one closed session to an aggregate row, inserting the row on first use"""
+    values = {
+        model.total_minutes: model.total_minutes + minutes,
+        model.session_count: model.session_count + 1
+    }
+    if finished_at is not None:
+        values[model.last_session_at] = case(
+            (model.last_session_at.is_(None), finished_at),
+            (model.last_session_at < finished_at, finished_at),
+            else_=model.last_session_at
+        )
+    
+    # Atomic increment so concurrent closes for the same user don't lose updates
+    updated = model.query.filter_by(**key).update(values, synchronize_session=False)
+    
+    if not updated:
+        row = model(total_minutes=minutes, session_count=1, **key)
+        if finished_at is not None:
+            row.last_session_at = finished_at
+        try:
+            # A concurrent first close may insert the row between the update and here;
+            # only the savepoint is rolled back, and the increment goes to its row
+            with db.session.begin_nested():
+                db.session.add(row)
+        except IntegrityError:
+            model.query.filter_by(**key).update(values, synchronize_session=False)
+
+def record_completed_session(study_session):
+    """Fold a just-closed session into the leaderboard aggregates (same transaction as the close)"""
+    minutes = study_session.duration_minutes or 0
+    finished_at = to_utc_naive(study_session.end_time)
+    
+    add_session_minutes(UserStudyTotals, {'user_id': study_session.user_id}, minutes, finished_at)
+    add_session_minutes(UserSubjectTotals, {
+        'user_id': study_session.user_id,
+        'subject': study_session.subject
+    }, minutes, finished_at)
+    add_session_minutes(StudyRollup, {
+        'bucket_date': to_utc_naive(study_session.start_time).date(),
+        'user_id': study_session.user_id,
+        'subject': study_session.subject
+    }, minutes)
+
+def close_study_session(study_session, end_time, notes=None):
+    """Set end time and duration on an open session and update the leaderboard aggregates
+
+    The close is a conditional UPDATE, so when two requests race to close the
+    same session only one of them folds its minutes into the aggregates; the
+    other gets False back.
+    """
+    duration = (to_utc_naive(end_time) - to_utc_naive(study_session.start_time)).total_seconds() / 60
+    values = {StudySession.end_time: end_time, StudySession.duration_minutes: int(duration)}
+    if notes:
+        values[StudySession.notes] = notes
+    closed = StudySession.query\
+        .filter(StudySession.id == study_session.id, StudySession.end_time.is_(None))\
+        .update(values, synchronize_session=False)
+    if closed != 1:
+        return False
+    
+    # The row is already written; record the values on the object without marking it dirty
+    for column, value in values.items():
+        set_committed_value(study_session, column.key, value)
+    record_completed_session(study_session)
+    return True
+
+def rebuild_study_totals():
+    """Recompute the leaderboard aggregates from study_session"""
+    UserStudyTotals.query.delete(synchronize_session=False)
+    UserSubjectTotals.query.delete(synchronize_session=False)
+    StudyRollup.query.delete(synchronize_session=False)
+    finished = StudySession.end_time.isnot(None)
+    
+    totals = select(
+        User.id,
+        func.coalesce(func.sum(StudySession.duration_minutes), 0),
+        func.count(StudySession.id),
+        func.max(StudySession.end_time)
+    ).select_from(User).outerjoin(
+        StudySession,
+        (StudySession.user_id == User.id) & finished
+    ).group_by(User.id)
+    
+    db.session.execute(insert(UserStudyTotals).from_select(
+        ['user_id', 'total_minutes', 'session_count', 'last_session_at'], totals
+    ))
+    
+    subject_totals = select(
+        StudySession.user_id,
+        StudySession.subject,
+        func.coalesce(func.sum(StudySession.duration_minutes), 0),
+        func.count(StudySession.id),
+        func.max(StudySession.end_time)
+    ).where(finished).group_by(StudySession.user_id, StudySession.subject)
+    
+    db.session.execute(insert(UserSubjectTotals).from_select(
+        ['user_id', 'subject', 'total_minutes', 'session_count', 'last_session_at'], subject_totals
+    ))
+    
+    # SQLite's CAST(... AS DATE) is numeric, so use DATE() where the dialect has it
+    if db.engine.dialect.name in ('sqlite', 'mysql'):
+        bucket = func.date(StudySession.start_time)
+    else:
+        bucket = cast(StudySession.start_time, db.Date)
+    
+    rollups = select(
+        bucket,
+        StudySession.user_id,
+        StudySession.subject,
+        func.coalesce(func.sum(StudySession.duration_minutes), 0),
+        func.count(StudySession.id)
+    ).where(finished).group_by(bucket, StudySession.user_id, StudySession.subject)
+    
+    db.session.execute(insert(StudyRollup).from_select(
+        ['bucket_date', 'user_id', 'subject', 'total_minutes', 'session_count'], rollups
+    ))
+    db.session.commit()
+    return UserStudyTotals.query.count()
+
+LEADERBOARD_PAGE_SIZE = 25
+LEADERBOARD_WINDOWS = {
+    'all': 'All Time',
+    'today': 'Today',
+    'week': 'This Week',
+    'month': 'This Month'
+}
+SUBJECTS = ['maths', 'english', 'reading', 'science', 'writing', 'social_studies']
+LeaderboardEntry = namedtuple('LeaderboardEntry', ['id', 'name', 'total_minutes', 'rank'])
+
+# The all-time board as a memory-mapped file every gunicorn worker reads (needs SHARED_STATE_DIR)
+leaderboard_snapshot = LeaderboardSnapshot(
+    os.path.join(app.config['SHARED_STATE_DIR'], 'leaderboard.bin'),
+    max_age=app.config.get('LEADERBOARD_SNAPSHOT_SECONDS', 5),
+    entry=LeaderboardEntry._make
+) if app.config.get('SHARED_STATE_DIR') else None
+
+def leaderboard_source(window='all', subject=None):
+    """(user_id, total_minutes) selectable behind a leaderboard window, optionally for one subject"""
+    if window == 'all':
+        if subject is None:
+            return UserStudyTotals.__table__
+        return select(UserSubjectTotals.user_id, UserSubjectTotals.total_minutes)\
+            .where(UserSubjectTotals.subject == subject).subquery()
+    
+    today = datetime.now(timezone.utc).date()
+    if window == 'today':
+        start = today
+    elif window == 'week':
+        start = today - timedelta(days=today.weekday())
+    else:
+        start = today.replace(day=1)
+    
+    # A range scan over the day buckets in the window
+    buckets = select(
+        StudyRollup.user_id,
+        func.sum(StudyRollup.total_minutes).label('total_minutes')
+    ).where(StudyRollup.bucket_date.between(start, today))
+    if subject is not None:
+        buckets = buckets.where(StudyRollup.subject == subject)
+    return buckets.group_by(StudyRollup.user_id).subquery()
+
+SubjectMinutes = namedtuple('SubjectMinutes', ['subject', 'minutes'])
+
+def subject_breakdown(user_id):
+    """A user's minutes per subject, read from the maintained per-subject totals"""
+    rows = db.session.query(UserSubjectTotals.subject, UserSubjectTotals.total_minutes)\
+        .filter_by(user_id=user_id)\
+        .order_by(UserSubjectTotals.total_minutes.desc()).all()
+    return tuple(SubjectMinutes(row.subject, row.total_minutes) for row in rows)
+
+def rank_for_minutes(minutes, source):
+    """Rank for a minute total: one more than the number of users strictly ahead of it"""
+    ahead = db.session.query(func.count()).select_from(source)\
+        .filter(source.c.total_minutes > minutes).scalar()
+    return ahead + 1
+
+def leaderboard_page(page, source, per_page=LEADERBOARD_PAGE_SIZE):
+    """One page of a ranked leaderboard; all-time reads in index order from user_study_totals"""
+    rows = db.session.query(User.id, User.name, source.c.total_minutes)\
+        .join(source, source.c.user_id == User.id)\
+        .order_by(source.c.total_minutes.desc(), source.c.user_id)\
+        .offset((page - 1) * per_page).limit(per_page).all()
+    
+    entries = []
+    for i, row in enumerate(rows):
+        if entries and row.total_minutes == entries[-1].total_minutes:
+            rank = entries[-1].rank  # ties share a rank
+        elif not entries and page > 1:
+            rank = rank_for_minutes(row.total_minutes, source)  # a tie may carry over from the previous page
+        else:
+            rank = (page - 1) * per_page + i + 1
+        entries.append(LeaderboardEntry(row.id, row.name, row.total_minutes, rank))
+    return entries
+
+def leaderboard_entry(user_id, source):
+    """A single user's leaderboard row and rank, or None if they have no minutes in the window"""
+    row = db.session.query(User.id, User.name, source.c.total_minutes)\
+        .join(source, source.c.user_id == User.id)\
+        .filter(User.id == user_id).first()
+    if row is None:
+        return None
+    return LeaderboardEntry(row.id, row.name, row.total_minutes, rank_for_minutes(row.total_minutes, source))
+
+def leaderboard_size(source):
+    return db.session.query(func.count()).select_from(source).scalar()
+
+def all_time_rows():
+    """Every ranked row for the snapshot, streamed in batches (it runs in the snapshot's rebuild thread)"""
+    with app.app_context():
+        yield from db.session.query(User.id, User.name, UserStudyTotals.total_minutes)\
+            .join(UserStudyTotals, UserStudyTotals.user_id == User.id)\
+            .order_by(UserStudyTotals.total_minutes.desc(), UserStudyTotals.user_id)\
+            .execution_options(yield_per=1000)
+
+def shared_leaderboard(window, subject):
+    """The shared snapshot if it can serve this leaderboard (all time, every subject), else None"""
+    if leaderboard_snapshot is None or window != 'all' or subject is not None:
+        return None
+    return leaderboard_snapshot.get(all_time_rows)
+
+DASHBOARD_RECENT_LIMIT = 5
+BookSummary = namedtuple('BookSummary', ['id', 'title', 'author', 'date_read'])
+BookRef = namedtuple('BookRef', ['id', 'title'])
+SessionSummary = namedtuple('SessionSummary', ['id', 'subject', 'start_time', 'end_time', 'duration_minutes', 'notes', 'book'])
+
+LibraryBook = namedtuple('LibraryBook', ['id', 'title', 'author', 'summary', 'date_read'])
+
+@dataclass(frozen=True)
+class DashboardData:
+    """Everything the dashboard and study pages show for one user"""
+    user_books: tuple
+    recent_books: tuple
+    recent_sessions: tuple
+    active_session: SessionSummary = None
+
+def load_dashboard_data(user_id, session_limit=DASHBOARD_RECENT_LIMIT):
+    """Load a user's books, finished sessions and active session in a single UNION ALL round trip
+    
+    session_limit caps the finished sessions (newest first); None loads all of them.
+    """
+    def no_value(type_, name):
+        return cast(null(), type_).label(name)
+    
+    books = select(
+        literal('book').label('kind'),
+        Book.id.label('id'),
+        Book.title.label('title'),
+        Book.author.label('author'),
+        no_value(db.String(50), 'subject'),
+        Book.date_read.label('at'),
+        no_value(db.DateTime, 'end_time'),
+        no_value(db.Integer, 'duration_minutes'),
+        no_value(db.Text, 'notes'),
+        no_value(db.Integer, 'book_id'),
+        no_value(db.String(200), 'book_title')
+    ).where(Book.user_id == user_id)
+    
+    def sessions(kind, condition, limit):
+        query = select(
+            literal(kind),
+            StudySession.id,
+            no_value(db.String(200), 'title'),
+            no_value(db.String(100), 'author'),
+            StudySession.subject,
+            StudySession.start_time,
+            StudySession.end_time,
+            StudySession.duration_minutes,
+            StudySession.notes,
+            StudySession.book_id,
+            Book.title
+        ).select_from(StudySession).outerjoin(Book, Book.id == StudySession.book_id)\
+         .where(StudySession.user_id == user_id, condition)
+        if limit is not None:
+            query = query.order_by(StudySession.start_time.desc()).limit(limit)
+        return query
+    
+    branches = [
+        books,
+        sessions('session', StudySession.end_time.isnot(None), session_limit),
+        sessions('active', StudySession.end_time.is_(None), 1)
+    ]
+    # Each branch is wrapped so LIMIT/ORDER BY stay legal inside the compound statement
+    rows = db.session.execute(union_all(*(select(branch.subquery()) for branch in branches))).all()
+    
+    user_books, finished, active = [], [], None
+    for row in rows:
+        if row.kind == 'book':
+            user_books.append(BookSummary(row.id, row.title, row.author, row.at))
+        else:
+            book = BookRef(row.book_id, row.book_title) if row.book_id and row.book_title else None
+            summary = SessionSummary(row.id, row.subject, row.at, row.end_time,
+                                     row.duration_minutes, row.notes, book)
+            if row.kind == 'active':
+                active = summary
+            else:
+                finished.append(summary)
+    
+    user_books.sort(key=lambda book: book.title)
+    finished.sort(key=lambda session: session.start_time, reverse=True)
+    recent_books = sorted(user_books, key=lambda book: book.date_read or datetime.min, reverse=True)
+    
+    return DashboardData(
+        user_books=tuple(user_books),
+        recent_books=tuple(recent_books[:DASHBOARD_RECENT_LIMIT]),
+        recent_sessions=tuple(finished),
+        active_session=active
+    )
+
+STUDY_PAGE_SIZE = 20
+ActiveSession = namedtuple('ActiveSession', ['id', 'subject', 'start_time'])
+
+def load_active_session(user_id):
+    """The user's open study session, or None; served by idx_study_session_active"""
+    # Always from the primary: a lagging replica could report a finished session as running
+    with use_primary():
+        row = db.session.query(StudySession.id, StudySession.subject, StudySession.start_time)\
+            .filter(StudySession.user_id == user_id, StudySession.end_time.is_(None)).first()
+    return ActiveSession(*row) if row else None
+
+def current_active_session(user_id):
+    """Registry lookup for /study/current; only goes to the database after an eviction or restart"""
+    return user_cache.get_or_load(user_id, 'active', lambda: load_active_session(user_id))
+
+def session_event(active_session):
+    """Payload for /study/current and the 'session' event of /study/events"""
+    if active_session is None:
+        return {'active': False}
+    start_time = to_utc_naive(active_session.start_time)
+    return {
+        'active': True,
+        'session_id': active_session.id,
+        'subject': active_session.subject,
+        'elapsed_seconds': int((to_utc_naive(datetime.now(timezone.utc)) - start_time).total_seconds()),
+        'start_time': start_time.replace(tzinfo=timezone.utc).isoformat()
+    }
+
+def elapsed_event(state):
+    """Heartbeat for an open session, so every tab's timer stays on the server's clock"""
+    if not state.get('active'):
+        return None
+    started = datetime.fromisoformat(state['start_time'])
+    return 'elapsed', {'session_id': state['session_id'],
+                       'elapsed_seconds': int((datetime.now(timezone.utc) - started).total_seconds())}
+
+StudyStats = namedtuple('StudyStats', ['total_minutes', 'session_count', 'average_minutes', 'subject_count'])
+
+def study_stats(user_id):
+    """Headline study numbers from the per-subject totals: one aggregate over a handful of rows"""
+    total_minutes, session_count, subject_count = db.session.query(
+        func.coalesce(func.sum(UserSubjectTotals.total_minutes), 0),
+        func.coalesce(func.sum(UserSubjectTotals.session_count), 0),
+        func.count()
+    ).filter(UserSubjectTotals.user_id == user_id).one()
+    average_minutes = round(total_minutes / session_count) if session_count else 0
+    return StudyStats(total_minutes, session_count, average_minutes, subject_count)
+
+def keyset_cursor(timestamp, row_id):
+    return f'{timestamp.isoformat() if timestamp is not None else "null"}_{row_id}'
+
+def parse_keyset_cursor(value, nullable=False):
+    """Turn a ?before= cursor back into (timestamp, id), or None if it is missing or malformed
+
+    With nullable, a cursor taken at a row without a timestamp parses to (None, id).
+    """
+    if not value:
+        return None
+    timestamp, _, row_id = value.rpartition('_')
+    try:
+        if timestamp == 'null':
+            return (None, int(row_id)) if nullable else None
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        return None
+
+def load_session_page(user_id, before=None, limit=STUDY_PAGE_SIZE):
+    """Finished sessions older than a (start_time, id) cursor, newest first
+    
+    Keyset pagination: each page is an index range read on (user_id, start_time), so
+    the cost of a page doesn't grow with the length of the history. Returns the page
+    and the cursor for the next one (None on the last page).
+    """
+    query = db.session.query(
+        StudySession.id,
+        StudySession.subject,
+        StudySession.start_time,
+        StudySession.end_time,
+        StudySession.duration_minutes,
+        StudySession.notes,
+        StudySession.book_id,
+        Book.title
+    ).outerjoin(Book, Book.id == StudySession.book_id)\
+     .filter(StudySession.user_id == user_id, StudySession.end_time.isnot(None))
+    
+    if before is not None:
+        start_time, session_id = before
+        query = query.filter(or_(
+            StudySession.start_time < start_time,
+            and_(StudySession.start_time == start_time, StudySession.id < session_id)
+        ))
+    
+    rows = query.order_by(StudySession.start_time.desc(), StudySession.id.desc()).limit(limit + 1).all()
+    sessions = tuple(
+        SessionSummary(row.id, row.subject, row.start_time, row.end_time, row.duration_minutes, row.notes,
+                       BookRef(row.book_id, row.title) if row.book_id and row.title else None)
+        for row in rows[:limit]
+    )
+    next_cursor = keyset_cursor(sessions[-1].start_time, sessions[-1].id) if len(rows) > limit else None
+    return sessions, next_cursor
+
+LIBRARY_PAGE_SIZE = 24
+
+def load_library_page(user_id, before=None, limit=LIBRARY_PAGE_SIZE):
+    """One page of a user's library, newest first, paginated by a (date_read, id) keyset cursor
+    
+    Books without a date_read (still being read) come after all dated ones, as on
+    the dashboard. NULL placement in a descending sort differs between databases,
+    so it is spelled out in both the ORDER BY and the cursor predicate.
+    """
+    query = db.session.query(Book.id, Book.title, Book.author, Book.summary, Book.date_read)\
+        .filter(Book.user_id == user_id)
+    
+    if before is not None:
+        date_read, book_id = before
+        if date_read is None:
+            query = query.filter(Book.date_read.is_(None), Book.id < book_id)
+        else:
+            query = query.filter(or_(
+                Book.date_read < date_read,
+                and_(Book.date_read == date_read, Book.id < book_id),
+                Book.date_read.is_(None)
+            ))
+    
+    undated_last = case((Book.date_read.is_(None), 1), else_=0)
+    rows = query.order_by(undated_last, Book.date_read.desc(), Book.id.desc()).limit(limit + 1).all()
+    books = tuple(LibraryBook(*row) for row in rows[:limit])
+    next_cursor = keyset_cursor(books[-1].date_read, books[-1].id) if len(rows) > limit else None
+    return books, next_cursor
+
+def library_size(user_id):
+    return db.session.query(func.count(Book.id)).filter(Book.user_id == user_id).scalar()
+
+@dataclass(frozen=True, eq=False)
+class UserSnapshot(UserMixin):
+    """The fields of the logged-in user that requests need, cached between requests"""
+    id: int
+    name: str
+    email: str
+    is_admin: bool
+    is_approved: bool
+
+def load_user_snapshot(user_id):
+    row = db.session.query(User.id, User.name, User.email, User.is_admin, User.is_approved)\
+        .filter(User.id == user_id).first()
+    return UserSnapshot(*row) if row else None
+
+def forget_user(user_id):
+    """Drop everything cached for a user id, after its account changes (call once committed)
+
+    Also needed when an account is created: SQLite reuses the id of a deleted
+    user, and a request that came in with the old cookie may have cached None.
+    """
+    user_cache.invalidate(user_id)
+    identity_cache.invalidate(user_id)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    return identity_cache.get_or_load(user_id, 'identity', lambda: load_user_snapshot(user_id))
 
 @app.route('/')
 def index():
@@ -93,8 +731,10 @@ def demo_login():
             is_approved=True,
             is_admin=False
         )
+        demo_user.study_totals = UserStudyTotals()
         db.session.add(demo_user)
         db.session.commit()
+        forget_user(demo_user.id)
         
         # Add sample books
         sample_books = [
@@ -139,6 +779,7 @@ def demo_login():
                 user_id=demo_user.id
             )
             db.session.add(session)
+            record_completed_session(session)
         
         db.session.commit()
     
@@ -150,11 +791,8 @@ def google_auth():
     token = request.json.get('token')
     
     try:
-        # Verify the token with Google
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), app.config['GOOGLE_CLIENT_ID'])
-        
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise ValueError('Wrong issuer.')
+        # Verify the token against Google's cached signing certificates
+        idinfo = google_verifier.verify(token)
         
         google_id = idinfo['sub']
         email = idinfo['email']
@@ -165,10 +803,7 @@ def google_auth():
         
         if not user:
             # Check if email is in admin list for admin privileges
-            admin_emails = os.environ.get('ADMIN_EMAILS', '').split(',')
-            admin_emails = [email.strip() for email in admin_emails if email.strip()]
-            
-            is_admin = email in admin_emails
+            is_admin = role_resolver.is_admin(email)
             is_approved = True  # Auto-approve ALL users (no approval required)
             
             # Create new user
@@ -179,8 +814,10 @@ def google_auth():
                 is_approved=is_approved,
                 is_admin=is_admin
             )
+            user.study_totals = UserStudyTotals()
             db.session.add(user)
             db.session.commit()
+            forget_user(user.id)
             
             # All users are now auto-approved, continue to login
         
@@ -200,28 +837,58 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@read_only_view
 def dashboard():
-    # Get recent books and study sessions
-    recent_books = Book.query.filter_by(user_id=current_user.id).order_by(Book.date_read.desc()).limit(5).all()
-    recent_sessions = StudySession.query.filter_by(user_id=current_user.id).filter(StudySession.end_time.isnot(None)).order_by(StudySession.start_time.desc()).limit(5).all()
-    
-    # Get all user's books for reading session selection
-    user_books = Book.query.filter_by(user_id=current_user.id).order_by(Book.title.asc()).all()
-    
-    # Check for active study session
-    active_session = StudySession.query.filter_by(user_id=current_user.id, end_time=None).first()
+    # Books, recent sessions, the book dropdown and the active session in one round trip
+    user_id = current_user.id
+    data = user_cache.get_or_load(user_id, 'dashboard', lambda: load_dashboard_data(user_id))
     
     return render_template('dashboard.html', 
-                         recent_books=recent_books, 
-                         recent_sessions=recent_sessions,
-                         active_session=active_session,
-                         user_books=user_books)
+                         recent_books=data.recent_books, 
+                         recent_sessions=data.recent_sessions,
+                         active_session=data.active_session,
+                         user_books=data.user_books)
 
 @app.route('/books')
 @login_required
+@read_only_view
 def books():
-    books_list = Book.query.filter_by(user_id=current_user.id).order_by(Book.date_read.desc()).all()
-    return render_template('books.html', books=books_list)
+    user_id = current_user.id
+    query = request.args.get('q', '').strip()
+    total_books = user_cache.get_or_load(user_id, 'book_count', lambda: library_size(user_id))
+    
+    if query:
+        books_list, next_cursor = search_books(db.session, user_id, query, parse_search_cursor(request.args.get('after')))
+        return render_template('books.html', books=books_list, query=query, next_cursor=next_cursor,
+                               is_first_page='after' not in request.args, total_books=total_books)
+    
+    # Only the newest page is cached; older pages are cheap keyset reads
+    before = parse_keyset_cursor(request.args.get('before'), nullable=True)
+    if before is None:
+        books_list, next_cursor = user_cache.get_or_load(user_id, 'books', lambda: load_library_page(user_id))
+    else:
+        books_list, next_cursor = load_library_page(user_id, before)
+    
+    return render_template('books.html', books=books_list, query='', next_cursor=next_cursor,
+                           is_first_page=before is None, total_books=total_books)
+
+@app.route('/api/books/search')
+@login_required
+@read_only_view
+def api_book_search():
+    hits, next_cursor = search_books(db.session, current_user.id, request.args.get('q', ''),
+                                     parse_search_cursor(request.args.get('after')),
+                                     limit=min(max(request.args.get('limit', 8, type=int), 1), 50))
+    return jsonify({
+        'results': [{
+            'id': hit.id,
+            'title': hit.title,
+            'author': hit.author,
+            'snippet': str(hit.snippet),
+            'date_read': hit.date_read.isoformat() if hit.date_read else None
+        } for hit in hits],
+        'next': next_cursor
+    })
 
 @app.route('/books/add', methods=['POST'])
 @login_required
@@ -234,144 +901,260 @@ def add_book():
         book = Book(title=title, author=author, summary=summary, user_id=current_user.id)
         db.session.add(book)
         db.session.commit()
+        user_cache.invalidate(current_user.id, 'dashboard', 'books', 'book_count')
         flash('Book added successfully!', 'success')
     
     return redirect(url_for('books'))
 
 @app.route('/study')
 @login_required
+@read_only_view
 def study_sessions():
-    sessions = StudySession.query.filter_by(user_id=current_user.id).filter(StudySession.end_time.isnot(None)).order_by(StudySession.start_time.desc()).all()
-    active_session = StudySession.query.filter_by(user_id=current_user.id, end_time=None).first()
+    user_id = current_user.id
+    before = parse_keyset_cursor(request.args.get('before'))
+    
+    # The active session and book dropdown are the same data the dashboard shows
+    data = user_cache.get_or_load(user_id, 'dashboard', lambda: load_dashboard_data(user_id))
+    stats = user_cache.get_or_load(user_id, 'study_stats', lambda: study_stats(user_id))
     
-    # Get all user's books for reading session selection
-    user_books = Book.query.filter_by(user_id=current_user.id).order_by(Book.title.asc()).all()
+    # Only the newest page is cached; older pages are cheap keyset reads
+    if before is None:
+        sessions, next_cursor = user_cache.get_or_load(user_id, 'study', lambda: load_session_page(user_id))
+    else:
+        sessions, next_cursor = load_session_page(user_id, before)
     
-    return render_template('study_sessions.html', sessions=sessions, active_session=active_session, user_books=user_books)
+    return render_template('study_sessions.html',
+                         sessions=sessions,
+                         stats=stats,
+                         next_cursor=next_cursor,
+                         is_first_page=before is None,
+                         active_session=data.active_session,
+                         user_books=data.user_books)
+
+def begin_study_session(user_id, subject, start_time, book_id, close_at):
+    """Close the user's open session at close_at, if there is one, and open a new one"""
+    active_session = StudySession.query.filter_by(user_id=user_id, end_time=None).first()
+    if active_session:
+        close_study_session(active_session, close_at)
+    
+    session = StudySession(subject=subject, start_time=start_time, user_id=user_id, book_id=book_id)
+    db.session.add(session)
+    db.session.flush()
+    return ActiveSession(session.id, subject, to_utc_naive(start_time))
+
+def end_study_session(user_id, end_time, notes):
+    """Close the user's open session; returns its duration in minutes, or None if there was none"""
+    active_session = StudySession.query.filter_by(user_id=user_id, end_time=None).first()
+    if not active_session or not close_study_session(active_session, end_time, notes):
+        return None
+    return active_session.duration_minutes
+
+def commit_write(write):
+    """Run a write function and commit it, batched with other requests' writes when GROUP_COMMIT is on"""
+    if app.config.get('GROUP_COMMIT'):
+        return group_writer.run(write)
+    result = write()
+    db.session.commit()
+    return result
+
+def parse_browser_time(value):
+    """A timestamp sent by the browser, or the server's time if it is missing or malformed"""
+    if value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+    return datetime.now(timezone.utc)
 
 @app.route('/study/start', methods=['POST'])
 @login_required
 def start_study():
+    user_id = current_user.id
     subject = request.form.get('subject')
     book_id = request.form.get('book_id')
     
     # Get browser timestamp if provided, otherwise use server time
     browser_time = request.form.get('start_time')
-    if browser_time:
-        try:
-            start_time = datetime.fromisoformat(browser_time.replace('Z', '+00:00'))
-        except:
-            start_time = datetime.now(timezone.utc)
-    else:
-        start_time = datetime.now(timezone.utc)
+    start_time = parse_browser_time(browser_time)
     
-    # End any existing active session first
-    active_session = StudySession.query.filter_by(user_id=current_user.id, end_time=None).first()
-    if active_session:
-        end_time = datetime.now(timezone.utc) if not browser_time else start_time
-        active_session.end_time = end_time
-        duration = (active_session.end_time - active_session.start_time).total_seconds() / 60
-        active_session.duration_minutes = int(duration)
+    # Any existing active session ends when this one starts
+    close_at = start_time if browser_time else datetime.now(timezone.utc)
     
     # Validate book_id if provided (for reading sessions)
     book_id = int(book_id) if book_id and book_id.isdigit() else None
     
-    # Start new session
-    session = StudySession(subject=subject, start_time=start_time, user_id=current_user.id, book_id=book_id)
-    db.session.add(session)
-    db.session.commit()
+    active = commit_write(lambda: begin_study_session(user_id, subject, start_time, book_id, close_at))
+    user_cache.invalidate(user_id, 'dashboard', 'study', 'study_stats', 'stats')
+    generation = user_cache.put(user_id, 'active', active)
+    study_events.publish(user_id, 'session', session_event(active), generation)
     
-    return jsonify({'success': True, 'session_id': session.id, 'start_time': start_time.isoformat()})
+    return jsonify({'success': True, 'session_id': active.id, 'start_time': start_time.isoformat()})
 
 @app.route('/study/stop', methods=['POST'])
 @login_required
 def stop_study():
-    active_session = StudySession.query.filter_by(user_id=current_user.id, end_time=None).first()
+    user_id = current_user.id
+    end_time = parse_browser_time(request.form.get('end_time'))
+    notes = request.form.get('notes', '')
     
-    if active_session:
-        # Get browser timestamp if provided
-        browser_time = request.form.get('end_time')
-        if browser_time:
-            try:
-                end_time = datetime.fromisoformat(browser_time.replace('Z', '+00:00'))
-            except:
-                end_time = datetime.now(timezone.utc)
-        else:
-            end_time = datetime.now(timezone.utc)
-            
-        active_session.end_time = end_time
-        duration = (active_session.end_time - active_session.start_time).total_seconds() / 60
-        active_session.duration_minutes = int(duration)
-        
-        notes = request.form.get('notes', '')
-        if notes:
-            active_session.notes = notes
-        
-        db.session.commit()
-        
-        return jsonify({'success': True, 'duration': active_session.duration_minutes})
+    duration = commit_write(lambda: end_study_session(user_id, end_time, notes))
+    if duration is None:
+        return jsonify({'error': 'No active session'}), 400
+    
+    user_cache.invalidate(user_id, 'dashboard', 'study', 'study_stats', 'stats')
+    generation = user_cache.put(user_id, 'active', None)
+    study_events.publish(user_id, 'session', dict(session_event(None), duration=duration), generation)
     
-    return jsonify({'error': 'No active session'}), 400
+    return jsonify({'success': True, 'duration': duration})
 
 @app.route('/study/current')
 @login_required
 def current_study():
-    active_session = StudySession.query.filter_by(user_id=current_user.id, end_time=None).first()
+    return jsonify(session_event(current_active_session(current_user.id)))
+
+@app.route('/study/events')
+@login_required
+def study_event_stream():
+    """Server-Sent Events: 'session' on start/stop, 'elapsed' heartbeats and 'resync' hints"""
+    user_id = current_user.id
+    stream = study_events.subscribe(user_id)
+    if stream is None:
+        # The client falls back to polling /study/current
+        return jsonify({'error': 'Too many open event streams'}), 503, {'Retry-After': '60'}
     
-    if active_session:
-        elapsed = (datetime.now(timezone.utc) - active_session.start_time).total_seconds()
-        return jsonify({
-            'active': True,
-            'subject': active_session.subject,
-            'elapsed_seconds': int(elapsed),
-            'start_time': active_session.start_time.isoformat()
-        })
+    try:
+        initial = ('session', session_event(current_active_session(user_id)))
+    except Exception:
+        study_events.unsubscribe(user_id, stream)
+        raise
+    
+    # Another worker's start/stop only reaches this process through the shared cache backend
+    changed = None
+    if user_cache.backend is not None:
+        seen = [user_cache.generation(user_id, 'active')]
+        def changed(published):
+            # A start/stop in this process already reached the client as a 'session' event
+            generation = user_cache.generation(user_id, 'active')
+            fresh = generation not in (seen[0], published)
+            seen[0] = generation
+            return fresh
     
-    return jsonify({'active': False})
+    # The generator reads nothing from the database: the app context, and with it
+    # the pooled connection, is released as soon as this view returns
+    response = Response(study_events.stream(user_id, stream, initial, elapsed_event, changed),
+                        mimetype='text/event-stream')
+    response.call_on_close(lambda: study_events.unsubscribe(user_id, stream))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def leaderboard_window_arg():
+    window = request.args.get('window', 'all')
+    return window if window in LEADERBOARD_WINDOWS else 'all'
+
+def leaderboard_subject_arg():
+    subject = request.args.get('subject')
+    return subject if subject in SUBJECTS else None
 
 @app.route('/leaderboard')
 @login_required
+@read_only_view
 def leaderboard():
-    # Get all users with their total study minutes
-    from sqlalchemy import func
+    page = max(request.args.get('page', 1, type=int), 1)
+    window = leaderboard_window_arg()
+    subject = leaderboard_subject_arg()
+    source = leaderboard_source(window, subject)
     
-    # Calculate total study minutes for each user
-    leaderboard_data = db.session.query(
-        User.id,
-        User.name,
-        User.email,
-        func.coalesce(func.sum(StudySession.duration_minutes), 0).label('total_minutes')
-    ).outerjoin(StudySession).group_by(User.id, User.name, User.email)\
-     .order_by(func.coalesce(func.sum(StudySession.duration_minutes), 0).desc()).all()
+    # Only one page of rows plus the caller's own row is loaded. With the shared
+    # snapshot both come from it, so the caller's rank agrees with the page
+    board = shared_leaderboard(window, subject)
+    if board is not None:
+        leaderboard_data = board.page(page, LEADERBOARD_PAGE_SIZE)
+        top_three = leaderboard_data[:3] if page == 1 else board.page(1, 3)
+        total_users = len(board)
+        current_user_entry = board.find(current_user.id)
+        updated_at = datetime.fromtimestamp(board.built_at, timezone.utc)
+    else:
+        leaderboard_data = leaderboard_page(page, source)
+        top_three = leaderboard_data[:3] if page == 1 else leaderboard_page(1, source, 3)
+        total_users = leaderboard_size(source)
+        current_user_entry = leaderboard_entry(current_user.id, source)
+        updated_at = None
     
     # Get subject breakdown for current user
-    current_user_subjects = db.session.query(
-        StudySession.subject,
-        func.sum(StudySession.duration_minutes).label('minutes')
-    ).filter_by(user_id=current_user.id)\
-     .filter(StudySession.end_time.isnot(None))\
-     .group_by(StudySession.subject).all()
-    
-    # Calculate total users and current user rank
-    total_users = len(leaderboard_data)
-    current_user_rank = next((i + 1 for i, user in enumerate(leaderboard_data) 
-                            if user.id == current_user.id), total_users)
-    
-    # Get recent achievements (users who studied today)
-    from datetime import date
+    user_id = current_user.id
+    current_user_subjects = user_cache.get_or_load(user_id, 'stats', lambda: subject_breakdown(user_id))
+    
+    # Calculate current user rank
+    current_user_rank = current_user_entry.rank if current_user_entry else total_users
+    total_pages = max(math.ceil(total_users / LEADERBOARD_PAGE_SIZE), 1)
+    
+    # Get recent achievements (users who studied today), as a start_time range the index can serve
+    today_start, today_end = utc_day_range(datetime.now(timezone.utc).date())
     today_sessions = StudySession.query.join(User)\
-        .filter(func.date(StudySession.start_time) == date.today())\
+        .filter(StudySession.start_time >= today_start, StudySession.start_time < today_end)\
         .filter(StudySession.end_time.isnot(None))\
         .with_entities(User.name, StudySession.subject, StudySession.duration_minutes)\
         .order_by(StudySession.start_time.desc()).limit(10).all()
     
     return render_template('leaderboard.html', 
                          leaderboard=leaderboard_data,
+                         top_three=top_three,
+                         current_user_entry=current_user_entry,
                          current_user_subjects=current_user_subjects,
                          current_user_rank=current_user_rank,
                          total_users=total_users,
+                         updated_at=updated_at,
+                         page=page,
+                         total_pages=total_pages,
+                         window=window,
+                         windows=LEADERBOARD_WINDOWS,
+                         subject=subject,
+                         subjects=SUBJECTS,
                          today_sessions=today_sessions)
 
+@app.route('/api/subjects')
+@login_required
+@read_only_view
+def api_subject_breakdown():
+    return jsonify({
+        'subjects': [{'subject': row.subject, 'minutes': row.minutes} for row in subject_breakdown(current_user.id)]
+    })
+
+@app.route('/api/leaderboard')
+@login_required
+@read_only_view
+def api_leaderboard():
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', LEADERBOARD_PAGE_SIZE, type=int), 1), 100)
+    window = leaderboard_window_arg()
+    subject = leaderboard_subject_arg()
+    source = leaderboard_source(window, subject)
+    
+    board = shared_leaderboard(window, subject)
+    if board is not None:
+        entries = board.page(page, per_page)
+        total_users = len(board)
+        current_user_entry = board.find(current_user.id)
+        updated_at = datetime.fromtimestamp(board.built_at, timezone.utc).isoformat()
+    else:
+        entries = leaderboard_page(page, source, per_page)
+        total_users = leaderboard_size(source)
+        current_user_entry = leaderboard_entry(current_user.id, source)
+        updated_at = None
+    
+    return jsonify({
+        'window': window,
+        'subject': subject,
+        'page': page,
+        'per_page': per_page,
+        'total_users': total_users,
+        'total_pages': max(math.ceil(total_users / per_page), 1),
+        'updated_at': updated_at,
+        'entries': [entry._asdict() for entry in entries],
+        'current_user': current_user_entry._asdict() if current_user_entry else None
+    })
+
 # Admin routes for user approval
 def admin_required(f):
     """Decorator to require admin access"""
@@ -386,6 +1169,7 @@ def admin_required(f):
 @app.route('/admin')
 @login_required
 @admin_required
+@read_only_view
 def admin_dashboard():
     # Get pending users
     pending_users = User.query.filter_by(is_approved=False).order_by(User.approval_requested_at.desc()).all()
@@ -404,6 +1188,7 @@ def approve_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_approved = True
     db.session.commit()
+    forget_user(user_id)
     
     flash(f'User {user.name} ({user.email}) has been approved!', 'success')
     return redirect(url_for('admin_dashboard'))
@@ -417,6 +1202,7 @@ def deny_user(user_id):
     # Remove the user entirely (they can re-register if needed)
     db.session.delete(user)
     db.session.commit()
+    forget_user(user_id)
     
     flash(f'User request from {user.name} ({user.email}) has been denied and removed.', 'warning')
     return redirect(url_for('admin_dashboard'))
@@ -434,11 +1220,34 @@ def toggle_admin(user_id):
     
     user.is_admin = not user.is_admin
     db.session.commit()
+    forget_user(user_id)
     
     status = 'granted' if user.is_admin else 'revoked'
     flash(f'Admin privileges {status} for {user.name} ({user.email})', 'success')
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/admin/cache-stats')
+@login_required
+@admin_required
+def cache_stats():
+    return jsonify({
+        'user_cache': user_cache.stats(),
+        'identity_cache': identity_cache.stats(),
+        'study_events': study_events.stats(),
+        'group_commit': group_writer.stats(),
+        'db_router': db_router.stats(),
+        'db_queries': query_counter.stats(),
+        'roles': role_resolver.stats(),
+        'leaderboard_snapshot': leaderboard_snapshot.stats() if leaderboard_snapshot is not None else None
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics.enabled or not metrics.authorized():
+        abort(404)
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
+
 @app.route('/test-oauth')
 def test_oauth():
     """Simple OAuth test page"""
@@ -482,6 +1291,6 @@ def test_oauth():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        ensure_schema(db, create=create_tables)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=app.config.get('DEBUG', False))
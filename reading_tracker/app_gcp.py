@@ -1,23 +1,25 @@
 # GCP-optimized version of the Reading Tracker application
 # This version includes GCP-specific configurations and health checks
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, session, flash, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 import os
 import logging
 from datetime import datetime, timedelta, timezone
 import json
-from dotenv import load_dotenv
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'Pipeline', 'config'))
 from gcp_config import Config
+from google_verifier import GoogleTokenVerifier
+from instrumentation import RequestTimer
+from metrics import Metrics
+from roles import RoleResolver
+import fast_start
 
-# Load environment variables (for local development)
-load_dotenv()
+# Load environment variables (for local development; skipped with FAST_START)
+fast_start.load_environment()
 
 def create_app():
     """Application factory for GCP deployment"""
@@ -27,12 +29,12 @@ def create_app():
     config_instance = Config()
     app.config.from_object(Config)
     
-    # Update with dynamic config values
+    # Update with dynamic config values (secrets are resolved once and reused below)
     dynamic_config = Config.get_config_dict()
     app.config.update(dynamic_config)
     
     # Validate configuration
-    config_errors = Config.validate_config()
+    config_errors = Config.validate_config(dynamic_config)
     if config_errors:
         for error in config_errors:
             app.logger.error(f"Configuration error: {error}")
@@ -40,7 +42,10 @@ def create_app():
             raise ValueError("Invalid configuration for production deployment")
     
     # Setup logging for GCP
-    if Config.is_cloud_run():
+    if Config.is_cloud_run() and fast_start.enabled():
+        # JSON lines on stdout are parsed by Cloud Run, without importing the logging client
+        fast_start.setup_json_logging(getattr(logging, Config.LOG_LEVEL))
+    elif Config.is_cloud_run():
         # Use structured logging for Cloud Run
         import google.cloud.logging
         client = google.cloud.logging.Client()
@@ -57,6 +62,25 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Server-Timing header and a structured timing log entry for a sample of requests
+request_timer = RequestTimer(app)
+
+# Checks Google sign-in tokens against locally cached signing certificates
+google_verifier = GoogleTokenVerifier(app.config.get('GOOGLE_CLIENT_ID'))
+
+# Admin addresses as a case-folded set, rebuilt when the admin-emails secret rotates
+role_resolver = RoleResolver({'admin': app.config.get('ADMIN_EMAILS', [])})
+
+def apply_rotated_secrets(changed):
+    """Swap rotated secrets into the running app (a new secret-key signs everyone out)"""
+    app.config.update(Config.get_config_dict())
+    google_verifier.client_id = app.config.get('GOOGLE_CLIENT_ID')
+    role_resolver.update({'admin': app.config.get('ADMIN_EMAILS', [])})
+    app.logger.info(f"Applied rotated secrets: {', '.join(sorted(changed))}")
+
+Config.secrets.on_change(apply_rotated_secrets)
+Config.secrets.start()
+
 # Models (same as original)
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -73,7 +97,7 @@ class User(UserMixin, db.Model):
     
     def is_admin_user(self):
         """Check if user is an admin based on email"""
-        return self.email in app.config.get('ADMIN_EMAILS', []) or self.is_admin
+        return self.is_admin or role_resolver.is_admin(self.email)
 
 class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -95,6 +119,14 @@ class StudySession(db.Model):
     
     book = db.relationship('Book', backref='study_sessions', lazy=True)
 
+# Prometheus metrics for /metrics, summed across gunicorn workers with PROMETHEUS_MULTIPROC_DIR
+metrics = Metrics(
+    app,
+    engines={'primary': lambda: db.engine},
+    active_sessions=lambda: db.session.query(db.func.count(StudySession.id))
+        .filter(StudySession.end_time.is_(None)).scalar()
+)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -105,7 +137,7 @@ def health_check():
     """Health check endpoint for GCP load balancer"""
     try:
         # Test database connection
-        db.session.execute('SELECT 1')
+        db.session.execute(db.text('SELECT 1'))
         
         return jsonify({
             'status': 'healthy',
@@ -122,6 +154,14 @@ def health_check():
             'timestamp': datetime.utcnow().isoformat()
         }), 503
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint: latency, in-flight requests, pool usage and open sessions"""
+    if not metrics.enabled or not metrics.authorized():
+        abort(404)
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
+
 # Add security headers middleware for production
 @app.after_request
 def add_security_headers(response):
@@ -147,10 +187,7 @@ def google_auth():
     token = request.json.get('token')
     
     try:
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), app.config['GOOGLE_CLIENT_ID'])
-        
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise ValueError('Wrong issuer.')
+        idinfo = google_verifier.verify(token)
         
         google_id = idinfo['sub']
         email = idinfo['email']
@@ -160,7 +197,7 @@ def google_auth():
         
         if not user:
             # Check if email is in admin list for admin privileges
-            is_admin = email in app.config.get('ADMIN_EMAILS', [])
+            is_admin = role_resolver.is_admin(email)
             is_approved = True  # Auto-approve ALL users (no approval required)
             
             user = User(
@@ -209,7 +246,7 @@ def dashboard():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        fast_start.ensure_schema(db)
     
     # Use the PORT environment variable for Cloud Run
     port = int(os.environ.get('PORT', 8080))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark a burst of concurrent /study/start requests with and without group commit
+Runs the Flask app in-process against a throwaway SQLite file, with a thread
+pool standing in for gunicorn's request threads.
+
+    python benchmarks/group_commit_bench.py --requests 500 --threads 8
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500, help='study starts in the burst (one per user)')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent request threads (gunicorn --threads)')
+    parser.add_argument('--rounds', type=int, default=3, help='bursts per mode; the best one is reported')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='group-commit-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    
+    from app import app, db, group_writer, User, UserStudyTotals, StudySession
+    
+    with app.app_context():
+        db.create_all()
+        for i in range(args.requests):
+            user = User(email=f'kid{i}@example.com', name=f'Kid {i}', google_id=f'bench-{i}', is_approved=True)
+            user.study_totals = UserStudyTotals()
+            db.session.add(user)
+        db.session.commit()
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+    
+    clients = []
+    for user_id in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        clients.append(client)
+    
+    def start(client):
+        began = time.perf_counter()
+        response = client.post('/study/start', data={'subject': 'maths'})
+        return response.status_code, time.perf_counter() - began
+    
+    def burst():
+        with app.app_context():
+            db.session.query(StudySession).delete()
+            db.session.commit()
+        began = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            results = list(pool.map(start, clients))
+        elapsed = time.perf_counter() - began
+        latencies = sorted(latency for _, latency in results)
+        return {
+            'ok': sum(1 for status, _ in results if status == 200),
+            'elapsed': elapsed,
+            'throughput': len(results) / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000
+        }
+    
+    print(f"📊 {args.requests} concurrent study starts on {args.threads} threads (SQLite, best of {args.rounds})")
+    for enabled in (False, True):
+        app.config['GROUP_COMMIT'] = enabled
+        best = max((burst() for _ in range(args.rounds)), key=lambda result: result['throughput'])
+        label = 'group commit' if enabled else 'per-request commit'
+        print(f"  {label:<20} {best['throughput']:7.1f} req/s   p50 {best['p50_ms']:6.1f} ms   "
+              f"p95 {best['p95_ms']:6.1f} ms   ok {best['ok']}/{args.requests}")
+    
+    stats = group_writer.stats()
+    print(f"  writer: {stats['writes']} writes in {stats['batches']} batches "
+          f"({stats['writes_per_batch']} per batch)")
+
+if __name__ == '__main__':
+    main()
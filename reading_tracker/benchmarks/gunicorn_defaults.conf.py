@@ -0,0 +1,6 @@
+"""
+Empty gunicorn config for the benchmarks
+Given with --config, it stops gunicorn from reading gunicorn.conf.py from the
+app directory, so a run measures gunicorn's defaults plus the flags the
+benchmark passes and stays comparable with results from before that file.
+"""
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Benchmark the main routes under mixed traffic, in-process or against gunicorn
+Seeds a SQLite database with generate_data.py (or reuses --db), then runs one
+virtual user per thread. Each one polls /study/current like the timer does,
+opens the dashboard and leaderboard, and starts and stops study sessions.
+Reports requests/s and p50/p95/p99 latency per route and writes them as JSON,
+so runs can be compared across commits with --compare.
+
+    python benchmarks/route_bench.py --mode wsgi --users 2000 --threads 8 --duration 20
+    python benchmarks/route_bench.py --mode gunicorn --workers 2 --compare before.json
+    python benchmarks/route_bench.py --mode gunicorn --config gunicorn.conf.py --workers 0 --worker-threads 0   # production
+
+Virtual users log in with a signed session cookie for a seeded user (the same
+cookie Flask-Login sets after Google sign-in), so no auth code changes are needed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_GUNICORN_CONFIG = os.path.join('benchmarks', 'gunicorn_defaults.conf.py')
+SECRET_KEY = 'route-bench-secret'
+
+# Relative weights of what a kid's browser does; the timer polls /study/current
+TRAFFIC_MIX = {
+    'study_current': 45,
+    'dashboard': 20,
+    'leaderboard': 15,
+    'study_toggle': 20,     # /study/start if idle, /study/stop if a session is open
+}
+
+ROUTES = {
+    'study_current': ('GET', '/study/current'),
+    'dashboard': ('GET', '/dashboard'),
+    'leaderboard': ('GET', '/leaderboard'),
+    'study_start': ('POST', '/study/start'),
+    'study_stop': ('POST', '/study/stop'),
+}
+
+SUBJECTS = ['maths', 'english', 'reading', 'science', 'writing', 'social_studies']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mode', choices=('wsgi', 'gunicorn'), default='wsgi',
+                        help='Flask test client in this process, or HTTP against a local gunicorn')
+    parser.add_argument('--db', help='existing SQLite database to run against (skips seeding)')
+    parser.add_argument('--users', type=int, default=1000, help='seeded users')
+    parser.add_argument('--books', type=float, default=20, help='average seeded books per user')
+    parser.add_argument('--sessions', type=float, default=200, help='average seeded sessions per user')
+    parser.add_argument('--seed', type=int, default=42, help='dataset and traffic seed')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds before the run')
+    parser.add_argument('--config', default=DEFAULT_GUNICORN_CONFIG,
+                        help="gunicorn config file, relative to the app directory (default: an empty one, gunicorn's defaults)")
+    parser.add_argument('--workers', type=int, default=2,
+                        help='gunicorn workers (gunicorn mode; 0 leaves them to --config)')
+    parser.add_argument('--worker-threads', type=int, default=8,
+                        help='gunicorn threads per worker (0 leaves them to --config)')
+    parser.add_argument('--gunicorn-arg', action='append', default=[],
+                        help='extra gunicorn argument, e.g. --gunicorn-arg=--preload (repeatable)')
+    parser.add_argument('--output', help='JSON results file (default: benchmarks/results/<mode>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier JSON results to print the change against')
+    return parser.parse_args()
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def seed_database(args):
+    path = os.path.join(tempfile.mkdtemp(prefix='route-bench-'), 'bench.db')
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + path)
+    print(f"🎲 Seeding {args.users} users into {path}...")
+    subprocess.run([sys.executable, 'generate_data.py', '--users', str(args.users), '--books', str(args.books),
+                    '--sessions', str(args.sessions), '--seed', str(args.seed)],
+                   cwd=APP_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    return path
+
+def session_cookies(db_path, count, seed):
+    """Signed Flask session cookies for count approved users, as Flask-Login would store them"""
+    with sqlite3.connect(db_path) as conn:
+        user_ids = [row[0] for row in conn.execute('SELECT id FROM user WHERE is_approved = 1 ORDER BY id')]
+    if len(user_ids) < count:
+        raise SystemExit(f'❌ Need {count} approved users, the database has {len(user_ids)}')
+    signer = Flask(__name__)
+    signer.secret_key = SECRET_KEY
+    serializer = SecureCookieSessionInterface().get_signing_serializer(signer)
+    users = random.Random(seed).sample(user_ids, count)
+    return [serializer.dumps({'_user_id': str(user_id), '_fresh': True}) for user_id in users]
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class InProcessClient:
+    """Sends requests through the Flask test client (no HTTP, no server)"""
+
+    def __init__(self, app, cookie):
+        self.client = app.test_client(use_cookies=False)
+        self.headers = {'Cookie': f'session={cookie}'}
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data, headers=self.headers)
+        return response.status_code, response.get_json(silent=True)
+
+class HTTPClient:
+    """Sends requests over a keep-alive HTTP connection to the gunicorn server"""
+
+    def __init__(self, base_url, cookie):
+        import requests
+        self.base_url = base_url
+        self.session = requests.Session()
+        # An explicit Cookie header wins over anything the server sets (Secure cookies over http)
+        self.session.headers['Cookie'] = f'session={cookie}'
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, data=data, allow_redirects=False)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+class VirtualUser(threading.Thread):
+    """One logged-in kid clicking around until the run stops"""
+
+    def __init__(self, client, rng, clock):
+        super().__init__(daemon=True)
+        self.client = client
+        self.rng = rng
+        self.clock = clock
+        self.samples = {name: [] for name in ROUTES}
+        self.errors = {name: 0 for name in ROUTES}
+        status, body = client.request('GET', '/study/current')
+        self.studying = bool(body and body.get('active'))
+
+    def run(self):
+        actions, weights = zip(*TRAFFIC_MIX.items())
+        while not self.clock['stop']:
+            action = self.rng.choices(actions, weights)[0]
+            data = None
+            if action == 'study_toggle':
+                action = 'study_stop' if self.studying else 'study_start'
+                data = {'notes': 'Benchmark'} if self.studying else {'subject': self.rng.choice(SUBJECTS)}
+            method, path = ROUTES[action]
+
+            began = time.perf_counter()
+            try:
+                status, _ = self.client.request(method, path, data)
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - began
+
+            if action in ('study_start', 'study_stop') and status == 200:
+                self.studying = action == 'study_start'
+            if self.clock['measuring']:
+                if status >= 300:
+                    self.errors[action] += 1
+                self.samples[action].append(elapsed)
+
+def run_traffic(clients, args):
+    clock = {'stop': False, 'measuring': False}
+    rng = random.Random(args.seed)
+    users = [VirtualUser(client, random.Random(rng.random()), clock) for client in clients]
+    for user in users:
+        user.start()
+    time.sleep(args.warmup)
+    clock['measuring'] = True
+    began = time.perf_counter()
+    time.sleep(args.duration)
+    clock['measuring'] = False
+    elapsed = time.perf_counter() - began
+    clock['stop'] = True
+    for user in users:
+        user.join()
+
+    routes = {}
+    for name, (method, path) in ROUTES.items():
+        latencies = sorted(sample for user in users for sample in user.samples[name])
+        ms = lambda value: round(value * 1000, 2) if value is not None else None
+        routes[name] = {
+            'method': method,
+            'path': path,
+            'requests': len(latencies),
+            'errors': sum(user.errors[name] for user in users),
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': ms(percentile(latencies, 0.50)),
+            'p95_ms': ms(percentile(latencies, 0.95)),
+            'p99_ms': ms(percentile(latencies, 0.99)),
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return routes, {'requests': total, 'requests_per_second': round(total / elapsed, 1), 'seconds': round(elapsed, 2)}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_gunicorn(db_path, args):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + db_path, SECRET_KEY=SECRET_KEY, FLASK_ENV='production')
+    # Always name a config, or gunicorn would pick up gunicorn.conf.py from the app directory
+    sizing = (['--workers', str(args.workers)] if args.workers else []) + \
+             (['--threads', str(args.worker_threads)] if args.worker_threads else [])
+    command = [sys.executable, '-m', 'gunicorn', '--config', args.config, *sizing, '--bind', f'127.0.0.1:{port}',
+               '--log-level', 'warning', *args.gunicorn_arg, 'app:app']
+    server = subprocess.Popen(command, cwd=APP_DIR, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'❌ gunicorn exited with status {server.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit('❌ gunicorn did not start listening within 60s')
+
+def print_results(results, baseline=None):
+    print(f"\n{'route':<15}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, route in results['routes'].items():
+        line = (f"{name:<15}{route['requests_per_second']:>9}{route['p50_ms'] or 0:>10}"
+                f"{route['p95_ms'] or 0:>10}{route['p99_ms'] or 0:>10}{route['errors']:>8}")
+        before = (baseline or {}).get('routes', {}).get(name)
+        if before and before.get('p95_ms') and route['p95_ms']:
+            change = (route['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            line += f"   p95 {change:+.0f}% vs {baseline['meta']['commit']}"
+        print(line)
+    total = results['total']
+    print(f"{'total':<15}{total['requests_per_second']:>9}")
+    if baseline:
+        change = (total['requests_per_second'] - baseline['total']['requests_per_second']) \
+            / baseline['total']['requests_per_second'] * 100
+        print(f"   throughput {change:+.0f}% vs {baseline['meta']['commit']}")
+
+def main():
+    args = parse_args()
+    db_path = os.path.abspath(args.db) if args.db else seed_database(args)
+    cookies = session_cookies(db_path, args.threads, args.seed)
+
+    server = None
+    if args.mode == 'gunicorn':
+        server, base_url = start_gunicorn(db_path, args)
+        clients = [HTTPClient(base_url, cookie) for cookie in cookies]
+    else:
+        os.environ.update(DATABASE_URL='sqlite:///' + db_path, SECRET_KEY=SECRET_KEY, FLASK_ENV='production')
+        sys.path.insert(0, APP_DIR)
+        from app import app
+        clients = [InProcessClient(app, cookie) for cookie in cookies]
+
+    print(f"📊 {args.mode}: {args.threads} virtual users for {args.duration:g}s "
+          f"(after {args.warmup:g}s warmup)")
+    try:
+        routes, total = run_traffic(clients, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+
+    commit = git_commit()
+    results = {
+        'meta': {
+            'commit': commit,
+            'mode': args.mode,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'dataset': {'db': db_path, 'users': args.users, 'books': args.books,
+                        'sessions': args.sessions, 'seed': args.seed} if not args.db else {'db': db_path},
+            'threads': args.threads,
+            'duration': args.duration,
+            'gunicorn': {'config': args.config, 'workers': args.workers, 'threads': args.worker_threads,
+                         'args': args.gunicorn_arg} if args.mode == 'gunicorn' else None,
+            'traffic_mix': TRAFFIC_MIX,
+        },
+        'routes': routes,
+        'total': total,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(APP_DIR, 'benchmarks', 'results', f'{args.mode}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {output}")
+
+if __name__ == '__main__':
+    main()
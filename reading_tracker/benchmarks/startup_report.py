@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Report cold-start cost: import time by module and time to first response
+Runs `python -X importtime -c "import app"` to show which imports dominate,
+then starts gunicorn from scratch several times and measures how long it takes
+until the first request is answered, as a Cloud Run cold start would. Runs
+with and without FAST_START and writes the numbers as JSON to compare across
+commits.
+
+    python benchmarks/startup_report.py --module app --path /login
+    python benchmarks/startup_report.py --module app_gcp --path /health --runs 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUNICORN_CONFIG = os.path.join('benchmarks', 'gunicorn_defaults.conf.py')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--module', default='app', help='module that defines the Flask app (app or app_gcp)')
+    parser.add_argument('--path', default='/login', help='URL the first request asks for')
+    parser.add_argument('--runs', type=int, default=3, help='cold starts per mode; the median is reported')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--output', help='JSON results file (default: benchmarks/results/startup-<commit>.json)')
+    return parser.parse_args()
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def parse_importtime(stderr):
+    """[(name, depth, self_us, cumulative_us)] from -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+def import_profile(module, env, top):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=APP_DIR,
+                            env=env, capture_output=True, text=True)
+    if result.returncode:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise SystemExit(f'❌ import {module} failed:\n' + '\n'.join(errors[-10:]))
+    imports = parse_importtime(result.stderr)
+    total = next(cumulative for name, depth, _, cumulative in imports if name == module and depth == 0)
+    direct = sorted(((name, cumulative) for name, depth, _, cumulative in imports if depth == 1),
+                    key=lambda item: item[1], reverse=True)
+    slowest = sorted(((name, self_us) for name, _, self_us, _ in imports), key=lambda item: item[1], reverse=True)
+    return {
+        'import_ms': round(total / 1000, 1),
+        'direct_imports_ms': {name: round(us / 1000, 1) for name, us in direct[:top]},
+        'slowest_self_ms': {name: round(us / 1000, 1) for name, us in slowest[:top]},
+        'loaded': {name for name, *_ in imports}
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def first_response(module, path, env):
+    """Seconds from starting gunicorn to the first answered request"""
+    port = free_port()
+    began = time.perf_counter()
+    # An empty config, so gunicorn.conf.py in the app directory isn't picked up
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', GUNICORN_CONFIG, '--workers', '1',
+                               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', f'{module}:app'],
+                              cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - began < 60:
+            if server.poll() is not None:
+                raise SystemExit(f'❌ gunicorn exited with status {server.returncode}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as response:
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                time.sleep(0.005)
+                continue
+            return time.perf_counter() - began, status
+        raise SystemExit('❌ no response within 60s')
+    finally:
+        server.terminate()
+        server.wait(30)
+
+def measure(args, env):
+    profile = import_profile(args.module, env, args.top)
+    timings = []
+    for _ in range(args.runs):
+        seconds, status = first_response(args.module, args.path, env)
+        timings.append(seconds)
+    profile['first_response_ms'] = round(statistics.median(timings) * 1000, 1)
+    profile['first_response_runs_ms'] = [round(seconds * 1000, 1) for seconds in timings]
+    profile['first_response_status'] = status
+    return profile
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='startup-report-')
+    base_env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(workdir, 'startup.db'),
+                    SECRET_KEY='startup-report-secret', PYTHONDONTWRITEBYTECODE='1')
+    # app_gcp refuses to start in production without a client id
+    base_env.setdefault('GOOGLE_CLIENT_ID', 'startup-report.apps.googleusercontent.com')
+    base_env.pop('FAST_START', None)
+    # Compile first, as the Docker image does, so no run pays for writing .pyc files
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', APP_DIR], check=True)
+
+    modes = {}
+    for mode, extra in (('default', {}), ('fast_start', {'FAST_START': 'true'})):
+        print(f"⏱️  {mode}: importing {args.module} and {args.runs} cold starts of gunicorn...")
+        modes[mode] = measure(args, dict(base_env, **extra))
+
+    default, fast = modes['default'], modes['fast_start']
+    print(f"\n{'':<22}{'default':>10}{'fast start':>12}")
+    print(f"{'import ' + args.module:<22}{default['import_ms']:>8} ms{fast['import_ms']:>10} ms")
+    print(f"{'first response':<22}{default['first_response_ms']:>8} ms{fast['first_response_ms']:>10} ms")
+    skipped = sorted(name for name in default['loaded'] - fast['loaded'] if '.' not in name)
+    if skipped:
+        print(f"\nNot imported with FAST_START: {', '.join(skipped)}")
+    print(f"\nSlowest imports of {args.module} (cumulative ms, fast start):")
+    for name, ms in fast['direct_imports_ms'].items():
+        print(f"  {name:<30}{ms:>8}")
+
+    commit = git_commit()
+    for profile in modes.values():
+        profile.pop('loaded')
+    results = {
+        'meta': {'commit': commit, 'module': args.module, 'path': args.path, 'runs': args.runs,
+                 'python': sys.version.split()[0], 'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())},
+        'modes': modes
+    }
+    output = args.output or os.path.join(APP_DIR, 'benchmarks', 'results', f'startup-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Full-text search over the book library
+SQLite uses an FTS5 table kept in sync by triggers, MySQL a FULLTEXT index and
+SQL Server a full-text catalog. Other databases fall back to LIKE matching.
+"""
+
+import re
+from collections import namedtuple
+from markupsafe import Markup, escape
+from sqlalchemy import DateTime, Float, text
+
+SEARCH_PAGE_SIZE = 20
+SNIPPET_WORDS = 12
+
+# Private-use characters mark matches inside snippets until the text has been escaped
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+
+SearchHit = namedtuple('SearchHit', ['id', 'title', 'author', 'date_read', 'snippet', 'score'])
+
+# The FTS table stores its own copy of the text plus an owner token ("u<user_id>"),
+# so a per-user search intersects posting lists instead of filtering every match
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        title, author, summary, owner,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts(rowid, title, author, summary, owner)
+        VALUES (new.id, new.title, new.author, new.summary, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN
+        DELETE FROM book_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE ON book BEGIN
+        DELETE FROM book_fts WHERE rowid = old.id;
+        INSERT INTO book_fts(rowid, title, author, summary, owner)
+        VALUES (new.id, new.title, new.author, new.summary, 'u' || new.user_id);
+    END"""
+]
+
+_SQLITE_SEARCH = """
+    SELECT id, title, author, date_read, snippet, score FROM (
+        SELECT b.id AS id, b.title AS title, b.author AS author, b.date_read AS date_read,
+               snippet(book_fts, 2, :mark_start, :mark_end, '…', :snippet_words) AS snippet,
+               bm25(book_fts, 10.0, 5.0, 1.0, 0.0) AS score
+        FROM book_fts JOIN book b ON b.id = book_fts.rowid
+        WHERE book_fts MATCH :match
+    )
+    WHERE score > :after_score OR (score = :after_score AND id > :after_id)
+    ORDER BY score, id
+    LIMIT :limit
+"""
+
+_MYSQL_SEARCH = """
+    SELECT id, title, author, date_read, summary AS snippet, score FROM (
+        SELECT id, title, author, date_read, summary,
+               -MATCH(title, author, summary) AGAINST (:match IN BOOLEAN MODE) AS score
+        FROM book
+        WHERE user_id = :user_id AND MATCH(title, author, summary) AGAINST (:match IN BOOLEAN MODE)
+    ) AS hits
+    WHERE score > :after_score OR (score = :after_score AND id > :after_id)
+    ORDER BY score, id
+    LIMIT :limit
+"""
+
+_MSSQL_SEARCH = """
+    SELECT TOP (:limit) id, title, author, date_read, snippet, score FROM (
+        SELECT b.id AS id, b.title AS title, b.author AS author, b.date_read AS date_read,
+               b.summary AS snippet, -CAST(hits.[RANK] AS FLOAT) AS score
+        FROM CONTAINSTABLE(book, (title, author, summary), :match) AS hits
+        JOIN book b ON b.id = hits.[KEY]
+        WHERE b.user_id = :user_id
+    ) AS ranked
+    WHERE score > :after_score OR (score = :after_score AND id > :after_id)
+    ORDER BY score, id
+"""
+
+_LIKE_SEARCH = """
+    SELECT id, title, author, date_read, summary AS snippet, 0.0 AS score
+    FROM book
+    WHERE user_id = :user_id AND id > :after_id AND ({conditions})
+    ORDER BY id
+    LIMIT :limit
+"""
+
+def search_terms(query):
+    """Lower-cased word tokens of a search box query"""
+    return re.findall(r'\w+', (query or '').lower())[:8]
+
+def ensure_search_index(connection):
+    """Create the full-text index for the connected database if it does not exist yet
+
+    Returns True when a new index was created over existing rows and needs a rebuild.
+    """
+    dialect = connection.dialect.name
+
+    if dialect == 'sqlite':
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_fts'"
+        )).first()
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        return not exists
+
+    if dialect == 'mysql':
+        exists = connection.execute(text(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'book' AND index_name = 'idx_book_fulltext'"
+        )).first()
+        if not exists:
+            connection.execute(text('ALTER TABLE book ADD FULLTEXT INDEX idx_book_fulltext (title, author, summary)'))
+        return False
+
+    # SQL Server refuses full-text DDL inside a transaction, so create_all's
+    # listeners can't add it; see ensure_fulltext_catalog
+    return False
+
+def ensure_fulltext_catalog(engine):
+    """SQL Server: create the full-text catalog and index on book if missing
+
+    Must run after create_all() rather than from its after_create listeners:
+    CREATE FULLTEXT INDEX is not allowed in a user transaction (error 574), so
+    it gets an autocommit connection of its own. A no-op on other databases.
+    """
+    if engine.dialect.name != 'mssql':
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if connection.execute(text("SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('book')")).first():
+            return
+        key_index = connection.execute(text(
+            "SELECT name FROM sys.indexes WHERE object_id = OBJECT_ID('book') AND is_primary_key = 1"
+        )).scalar()
+        if not connection.execute(text("SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'book_catalog'")).first():
+            connection.execute(text('CREATE FULLTEXT CATALOG book_catalog'))
+        connection.execute(text(
+            f'CREATE FULLTEXT INDEX ON book (title, author, summary) KEY INDEX [{key_index}] '
+            'ON book_catalog WITH CHANGE_TRACKING AUTO'
+        ))
+
+def rebuild_search_index(connection):
+    """Repopulate the SQLite FTS table from the book table (other engines maintain their own)"""
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.execute(text('DELETE FROM book_fts'))
+    connection.execute(text(
+        "INSERT INTO book_fts(rowid, title, author, summary, owner) "
+        "SELECT id, title, author, summary, 'u' || user_id FROM book"
+    ))
+
+def _highlight(snippet, terms):
+    """Escape a snippet and wrap the matched words in <mark> tags"""
+    if not snippet:
+        return Markup('')
+    if _MARK_START not in snippet:
+        # Engines without snippet support: trim the summary and mark the terms ourselves
+        words = snippet.split()
+        snippet = ' '.join(words[:SNIPPET_WORDS * 2]) + (' …' if len(words) > SNIPPET_WORDS * 2 else '')
+        for term in terms:
+            snippet = re.sub(r'(?i)\b(' + re.escape(term) + r'\w*)', _MARK_START + r'\1' + _MARK_END, snippet)
+    html = str(escape(snippet))
+    return Markup(html.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+def search_cursor(hit):
+    return f'{hit.score!r}_{hit.id}'
+
+def parse_search_cursor(value):
+    """Turn an ?after= cursor back into (score, id), or None to start from the best match"""
+    score, _, hit_id = (value or '').rpartition('_')
+    try:
+        return float(score), int(hit_id)
+    except ValueError:
+        return None
+
+def search_books(session, user_id, query, after=None, limit=SEARCH_PAGE_SIZE):
+    """Ranked search of one user's books by title, author and summary
+
+    Results are ordered by (score, id), best first, and paginated with a keyset
+    cursor over that pair. Returns the hits and the cursor for the next page.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return (), None
+
+    # A finite floor rather than -inf, which MySQL and SQL Server can't bind
+    after_score, after_id = after if after is not None else (-1e300, 0)
+    dialect = session.get_bind().dialect.name
+    params = {'user_id': user_id, 'after_score': after_score, 'after_id': after_id, 'limit': limit + 1}
+
+    if dialect == 'sqlite':
+        words = ' '.join(f'"{term}"*' for term in terms)
+        params.update(match=f'owner : "u{user_id}" AND {{title author summary}} : ({words})',
+                      mark_start=_MARK_START, mark_end=_MARK_END, snippet_words=SNIPPET_WORDS)
+        statement = _SQLITE_SEARCH
+    elif dialect == 'mysql':
+        params['match'] = ' '.join(f'+{term}*' for term in terms)
+        statement = _MYSQL_SEARCH
+    elif dialect == 'mssql':
+        params['match'] = ' AND '.join(f'"{term}*"' for term in terms)
+        statement = _MSSQL_SEARCH
+    else:
+        conditions = []
+        for i, term in enumerate(terms):
+            params[f'term{i}'] = f'%{term}%'
+            conditions.append(f'(LOWER(title) LIKE :term{i} OR LOWER(author) LIKE :term{i} OR LOWER(summary) LIKE :term{i})')
+        statement = _LIKE_SEARCH.format(conditions=' AND '.join(conditions))
+
+    rows = session.execute(
+        text(statement).columns(date_read=DateTime, score=Float), params
+    ).all()
+
+    hits = tuple(
+        SearchHit(row.id, row.title, row.author, row.date_read, _highlight(row.snippet, terms), row.score)
+        for row in rows[:limit]
+    )
+    next_cursor = search_cursor(hits[-1]) if len(rows) > limit else None
+    return hits, next_cursor
@@ -0,0 +1,257 @@
+"""
+Caching helpers for the Reading & Study Tracker
+A bounded in-process LRU plus a per-user read-through cache that can share
+entries and invalidations across gunicorn workers through a SQLite file.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used cache with hit/miss/eviction counters
+
+    With a ttl (seconds), entries older than that are treated as misses.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class SQLiteCacheBackend:
+    """Shared cache store in a local SQLite file, visible to every worker on the host
+
+    Entries are pickled values tagged with a generation number. Invalidating a key
+    bumps its generation, so stale copies held by any worker stop matching. Keys
+    can also carry a deadline (a timestamp) that every worker sees.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def _connection(self):
+        # Opened on first use by each thread of each process, so a gunicorn master that
+        # preloads the app holds no connection for its forked workers to share
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, generation INTEGER NOT NULL, value BLOB NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_generation (key TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_deadline (key TEXT PRIMARY KEY, until REAL NOT NULL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def generation(self, key):
+        row = self._connection().execute('SELECT generation FROM cache_generation WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, key):
+        """Invalidate a key everywhere and return its new generation"""
+        conn = self._connection()
+        conn.execute('INSERT INTO cache_generation (key, generation) VALUES (?, 1) '
+                     'ON CONFLICT(key) DO UPDATE SET generation = generation + 1', (key,))
+        conn.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+        return self.generation(key)
+
+    def get(self, key, generation):
+        row = self._connection().execute('SELECT value FROM cache_entry WHERE key = ? AND generation = ?',
+                                         (key, generation)).fetchone()
+        return pickle.loads(row[0]) if row else _MISSING
+
+    def set(self, key, generation, value):
+        self._connection().execute('INSERT OR REPLACE INTO cache_entry (key, generation, value) VALUES (?, ?, ?)',
+                                   (key, generation, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+    def deadline(self, key):
+        row = self._connection().execute('SELECT until FROM cache_deadline WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0.0
+
+    def extend_deadline(self, key, until):
+        """Move a key's deadline to until, unless it is already later"""
+        self._connection().execute('INSERT INTO cache_deadline (key, until) VALUES (?, ?) '
+                                   'ON CONFLICT(key) DO UPDATE SET until = MAX(until, excluded.until)', (key, until))
+
+class UserCache:
+    """Per-user read-through cache for page data, invalidated by the writes that change it
+
+    Values live in a bounded in-process LRU. With a shared backend the generation of
+    each key is checked there on every read, so an invalidation made by one worker is
+    seen by all of them, and a worker with a cold LRU can reuse another worker's entry.
+    With a ttl only the generations are shared, so no copy outlives the ttl anywhere.
+    """
+
+    def __init__(self, names, maxsize=1024, backend=None, ttl=None):
+        self.names = tuple(names)
+        self.local = LRUCache(maxsize, ttl)
+        self.backend = backend
+        self._share_values = backend is not None and ttl is None
+        self._generations = {}
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def _key(user_id, name):
+        return f'{user_id}:{name}'
+
+    def _generation(self, key):
+        if self.backend is not None:
+            return self.backend.generation(key)
+        return self._generations.get(key, 0)
+
+    def generation(self, user_id, name):
+        """Current generation of an entry; it changes whenever any worker writes or invalidates it"""
+        return self._generation(self._key(user_id, name))
+
+    def get_or_load(self, user_id, name, loader):
+        """Return the cached value for (user, name), calling loader() to fill it on a miss"""
+        key = self._key(user_id, name)
+        generation = self._generation(key)
+
+        entry = self.local.get(key)
+        if entry is not None and entry[0] == generation:
+            self._count('hits')
+            return entry[1]
+
+        if self._share_values:
+            value = self.backend.get(key, generation)
+            if value is not _MISSING:
+                self._count('shared_hits')
+                self.local.set(key, (generation, value))
+                return value
+
+        self._count('misses')
+        value = loader()
+        self.local.set(key, (generation, value))
+        if self._share_values:
+            self.backend.set(key, generation, value)
+        return value
+
+    def _count(self, counter):
+        # += on an attribute is a read then a write; request threads would lose counts
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _bump(self, key):
+        if self.backend is not None:
+            return self.backend.bump(key)
+        with self._lock:
+            generation = self._generations[key] = self._generations.get(key, 0) + 1
+            return generation
+
+    def put(self, user_id, name, value):
+        """Replace an entry with a value the caller just wrote, so the next read needs no loader
+        
+        Other workers' copies are invalidated the same way invalidate() does it.
+        Returns the entry's new generation.
+        """
+        key = self._key(user_id, name)
+        generation = self._bump(key)
+        self.local.set(key, (generation, value))
+        if self._share_values:
+            self.backend.set(key, generation, value)
+        return generation
+
+    def deadline(self, user_id, name):
+        """A per-user timestamp set with extend_deadline(), shared like the generations; 0 if unset"""
+        key = self._key(user_id, name)
+        if self.backend is not None:
+            return self.backend.deadline(key)
+        return self._deadlines.get(key, 0.0)
+
+    def extend_deadline(self, user_id, name, until):
+        key = self._key(user_id, name)
+        if self.backend is not None:
+            self.backend.extend_deadline(key, until)
+            return
+        with self._lock:
+            self._deadlines[key] = max(self._deadlines.get(key, 0.0), until)
+
+    def invalidate(self, user_id, *names):
+        """Drop a user's cached entries; with no names given, drop all of them"""
+        for name in names or self.names:
+            key = self._key(user_id, name)
+            self.local.delete(key)
+            self._bump(key)
+
+    def stats(self):
+        with self._lock:
+            hits, shared_hits, misses = self.hits, self.shared_hits, self.misses
+        lookups = hits + shared_hits + misses
+        return {
+            'size': len(self.local),
+            'maxsize': self.local.maxsize,
+            'hits': hits,
+            'shared_hits': shared_hits,
+            'misses': misses,
+            'evictions': self.local.evictions,
+            'expirations': self.local.expirations,
+            'hit_ratio': round((hits + shared_hits) / lookups, 4) if lookups else 0.0,
+            'backend': 'sqlite' if self.backend is not None else 'local'
+        }
@@ -37,6 +37,52 @@ class Config:
     SQLALCHEMY_DATABASE_URI = database_url or 'sqlite:///reading_tracker.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Optional read replica for read-only views; a user's reads stay on the primary
+    # for REPLICA_STICKY_SECONDS after their own writes so they always see them
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+    
+    # SQLite: memory-mapped I/O per connection, and a read-only pool for read-only views (0 disables it)
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', 8))
+    
+    # Per-user page cache (set USER_CACHE_BACKEND to a file path to share it between workers)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 2048))
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND')
+    
+    # Logged-in user snapshots, so an authenticated request needs no User lookup. Without
+    # USER_CACHE_BACKEND the admin routes' invalidations stay in their own worker, so the
+    # ttl defaults to a few seconds there instead of 300
+    USER_IDENTITY_CACHE_SIZE = int(os.environ.get('USER_IDENTITY_CACHE_SIZE', 4096))
+    USER_IDENTITY_TTL = int(os.environ['USER_IDENTITY_TTL']) if os.environ.get('USER_IDENTITY_TTL') else None
+    
+    # Group commit: batch study start/stop writes from concurrent requests (mainly for SQLite)
+    GROUP_COMMIT = os.environ.get('GROUP_COMMIT', 'false').lower() == 'true'
+    GROUP_COMMIT_DELAY_MS = float(os.environ.get('GROUP_COMMIT_DELAY_MS', 5))
+    GROUP_COMMIT_MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 64))
+    
+    # Scratch directory shared by gunicorn workers (gunicorn.conf.py sets it); enables the
+    # all-time leaderboard snapshot, rebuilt at most every LEADERBOARD_SNAPSHOT_SECONDS
+    SHARED_STATE_DIR = os.environ.get('SHARED_STATE_DIR')
+    LEADERBOARD_SNAPSHOT_SECONDS = float(os.environ.get('LEADERBOARD_SNAPSHOT_SECONDS', 5))
+    
+    # Study event streams each hold a gunicorn thread, so keep this below --threads
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 4))
+    
+    # N+1 guard: log views that lazy-load more relationships than this (raise with LAZY_LOAD_RAISE)
+    LAZY_LOAD_LIMIT = int(os.environ['LAZY_LOAD_LIMIT']) if os.environ.get('LAZY_LOAD_LIMIT') else None
+    LAZY_LOAD_RAISE = os.environ.get('LAZY_LOAD_RAISE', 'false').lower() == 'true'
+    
+    # Root log level, and 'json' for one JSON object per line on stdout or 'text'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    
+    # Share of requests timed for the Server-Timing header and timing log lines (0 to 1)
+    REQUEST_TIMING_SAMPLE_RATE = float(os.environ['REQUEST_TIMING_SAMPLE_RATE']) if os.environ.get('REQUEST_TIMING_SAMPLE_RATE') else None
+    
+    # Bearer token Prometheus must send to scrape /metrics (open when unset)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
     # Google OAuth
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     
@@ -45,12 +91,16 @@ class Config:
     
 class DevelopmentConfig(Config):
     DEBUG = True
+    LAZY_LOAD_LIMIT = Config.LAZY_LOAD_LIMIT if Config.LAZY_LOAD_LIMIT is not None else 10
+    REQUEST_TIMING_SAMPLE_RATE = Config.REQUEST_TIMING_SAMPLE_RATE if Config.REQUEST_TIMING_SAMPLE_RATE is not None else 1.0
     
 class ProductionConfig(Config):
     DEBUG = False
     # Additional production settings
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    REQUEST_TIMING_SAMPLE_RATE = Config.REQUEST_TIMING_SAMPLE_RATE if Config.REQUEST_TIMING_SAMPLE_RATE is not None else 0.01
     
 class AzureConfig(ProductionConfig):
     # Azure-specific production settings
@@ -0,0 +1,72 @@
+"""
+Shared setup for the tests
+app.py reads its configuration when it is first imported, and whichever test
+module pytest collects first would otherwise decide it. Every such module
+runs against one throwaway SQLite database, with lazy loading in routes
+treated as an error. The fixtures below build users and logged-in clients for
+app.py, and small standalone Flask-SQLAlchemy apps for testing the helpers.
+"""
+
+import os
+import tempfile
+import uuid
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='reading-tracker-tests-'), 'test.db')
+os.environ['LAZY_LOAD_LIMIT'] = '0'
+os.environ['LAZY_LOAD_RAISE'] = 'true'
+
+@pytest.fixture
+def make_user():
+    """Creates approved users with empty study totals in app.py's database; returns their ids"""
+    from app import app, db, User, UserStudyTotals
+
+    def make(name='Test Kid', **fields):
+        with app.app_context():
+            db.create_all()
+            user = User(email=f'{uuid.uuid4().hex}@example.com', name=name, google_id=uuid.uuid4().hex,
+                        **{'is_approved': True, **fields})
+            user.study_totals = UserStudyTotals()
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+@pytest.fixture
+def user(make_user):
+    """The id of a fresh approved user"""
+    return make_user()
+
+@pytest.fixture
+def client_for():
+    """A test client whose session cookie logs in the given user id, as Flask-Login sets it"""
+    from app import app
+
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return client_for
+
+@pytest.fixture
+def make_sqlite_app(tmp_path):
+    """Builds a bare Flask-SQLAlchemy app on a SQLite file in tmp_path, with one Note model
+
+    Returns (app, db, Note); extra keyword arguments go into app.config.
+    """
+    def make(filename='app.db', session_options=None, **config):
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / filename}', **config)
+        db = SQLAlchemy(app, session_options=session_options or {})
+
+        class Note(db.Model):
+            id = db.Column(db.Integer, primary_key=True)
+            text = db.Column(db.String(100), nullable=False)
+
+        return app, db, Note
+    return make
@@ -0,0 +1,172 @@
+"""
+Database connection setup and read routing
+Tunes every SQLite connection for concurrent use (WAL, memory-mapped reads,
+a busy timeout) and sends the queries of read-only views to a read engine:
+a read replica when DATABASE_REPLICA_URL is set, otherwise a pool of
+read-only connections to the same SQLite file.
+"""
+
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from functools import wraps
+from sqlalchemy import create_engine, event
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Applied to every SQLite connection; journal_mode is persistent and set by writers only
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,       # 20 MB page cache per connection
+    'temp_store': 'MEMORY',
+}
+
+def sqlite_connection_hook(mmap_size, read_only=False):
+    """A 'connect' listener that applies the production pragmas to a new SQLite connection"""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+    return on_connect
+
+def is_sqlite_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def dispose_inherited_pools(app):
+    """Forget pooled connections a forked worker inherited from its parent (gunicorn post_fork)
+
+    close=False leaves the sockets and file handles alone: they still belong to
+    the parent, and closing them from a child would break its connections.
+    """
+    with app.app_context():
+        engines = list(app.extensions['sqlalchemy'].engines.values())
+    router = app.extensions.get('db_router')
+    if router is not None and router.reader is not None:
+        engines.append(router.reader)
+    for engine in engines:
+        engine.dispose(close=False)
+    return len(engines)
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside a read-only view, for data that must not lag"""
+    previous = g.get('db_read_only', False) if has_request_context() else False
+    if has_request_context():
+        g.db_read_only = False
+    try:
+        yield
+    finally:
+        if has_request_context():
+            g.db_read_only = previous
+
+def read_only_view(view):
+    """Mark a view as read-only, so its queries may be served by the read engine"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+class DatabaseRouter:
+    """Owns the read engine and decides which engine a session query goes to
+
+    A replica can lag behind the primary, so after a user's own write their reads
+    stay on the primary for replica_sticky_seconds. The deadline goes in the
+    writer's session cookie and, with track_writers(), in a per-user store on the
+    server, so it also holds for the user's other tabs and devices.
+    """
+
+    def __init__(self, app=None, db=None):
+        self.reader = None
+        self.replica = False
+        self.sticky_seconds = 0
+        self._deadlines = None
+        self._writer_id = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        with app.app_context():
+            primary = db.engine
+
+        if is_sqlite_file(primary.url):
+            mmap_size = app.config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+            event.listen(primary, 'connect', sqlite_connection_hook(mmap_size))
+
+        replica_url = app.config.get('DATABASE_REPLICA_URL')
+        if replica_url:
+            options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+            options.setdefault('pool_pre_ping', True)
+            self.reader = create_engine(replica_url, **options)
+            self.replica = True
+            self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 10)
+            app.after_request(self._remember_write)
+        elif is_sqlite_file(primary.url):
+            pool_size = app.config.get('SQLITE_READ_POOL_SIZE', 8)
+            if pool_size:
+                self.reader = create_engine(primary.url, pool_size=pool_size, max_overflow=pool_size,
+                                            pool_pre_ping=False)
+                event.listen(self.reader, 'connect', sqlite_connection_hook(mmap_size, read_only=True))
+
+        app.extensions['db_router'] = self
+
+    def track_writers(self, deadlines, writer_id):
+        """Also keep each writer's primary deadline on the server, keyed by user
+
+        deadlines is a UserCache (its shared backend makes the deadline visible to
+        every worker) and writer_id() returns the id of the user making the current
+        request, or None. It must not query the database, since it runs while a
+        query is choosing its engine.
+        """
+        self._deadlines = deadlines
+        self._writer_id = writer_id
+
+    def _remember_write(self, response):
+        # Any successful mutation may have written; keep this user on the primary for a while
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            until = time.time() + self.sticky_seconds
+            session['db_primary_until'] = until
+            user_id = self._writer_id() if self._deadlines is not None else None
+            if user_id is not None:
+                self._deadlines.extend_deadline(user_id, 'db_primary', until)
+        return response
+
+    def _primary_until(self):
+        """The later of the cookie's and the user's server-side deadline, looked up once per request"""
+        if 'db_primary_until' not in g:
+            until = session.get('db_primary_until', 0)
+            user_id = self._writer_id() if self._deadlines is not None else None
+            if user_id is not None:
+                until = max(until, self._deadlines.deadline(user_id, 'db_primary'))
+            g.db_primary_until = until
+        return g.db_primary_until
+
+    def reads_allowed(self):
+        """Whether the current request may read from the read engine"""
+        if self.reader is None or not has_request_context() or not g.get('db_read_only', False):
+            return False
+        return not self.replica or self._primary_until() < time.time()
+
+    def stats(self):
+        return {
+            'reader': 'replica' if self.replica else ('sqlite-read-pool' if self.reader is not None else None),
+            'pool': self.reader.pool.status() if self.reader is not None else None
+        }
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from the router's read engine in read-only views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            router = current_app.extensions.get('db_router')
+            if router is not None and router.reads_allowed():
+                return router.reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
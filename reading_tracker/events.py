@@ -0,0 +1,120 @@
+"""
+Server-Sent Events for study session state
+One broker per process fans each user's start/stop events out to every tab that
+user has open. Streams never touch the database, so an open tab costs a thread
+and a small queue but not a pooled connection.
+"""
+
+import json
+import queue
+import threading
+import time
+
+def format_event(event, data):
+    """Serialise one SSE message"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+class EventBroker:
+    """Per-process publisher for per-user event streams
+
+    Every stream holds a gunicorn thread for as long as it is open, so the number
+    of streams is capped and each one ends after max_age seconds; EventSource
+    reconnects on its own, which lets idle threads go back to ordinary requests.
+    """
+
+    def __init__(self, max_streams=4, max_streams_per_user=2, heartbeat=15, max_age=300, queue_size=16):
+        self.max_streams = max_streams
+        self.max_streams_per_user = max_streams_per_user
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self.published = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id):
+        """Register a stream for a user; returns its queue, or None if the cap is reached"""
+        with self._lock:
+            streams = self._subscribers.setdefault(user_id, set())
+            if self._count >= self.max_streams or len(streams) >= self.max_streams_per_user:
+                self.rejected += 1
+                if not streams:
+                    del self._subscribers[user_id]
+                return None
+            stream = queue.Queue(self.queue_size)
+            streams.add(stream)
+            self._count += 1
+            return stream
+
+    def unsubscribe(self, user_id, stream):
+        with self._lock:
+            streams = self._subscribers.get(user_id)
+            if streams and stream in streams:
+                streams.discard(stream)
+                self._count -= 1
+                if not streams:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event, data, version=None):
+        """Send an event to every open stream of one user in this process
+
+        version identifies the state the event describes (e.g. a cache
+        generation) and is handed to the streams' changed() callbacks.
+        """
+        message = (event, data, version)
+        with self._lock:
+            streams = list(self._subscribers.get(user_id, ()))
+        for stream in streams:
+            try:
+                stream.put_nowait(message)
+            except queue.Full:
+                # A stalled client loses events rather than blocking the writer
+                self.dropped += 1
+        self.published += 1
+
+    def stream(self, user_id, stream, initial, heartbeat_event=None, changed=None):
+        """Generator of SSE text for one subscriber
+
+        initial is the (event, data) pair sent on connect. On each quiet heartbeat,
+        changed(version) is asked whether another worker changed the user's state
+        (the client is then told to resync); version is that of the last event
+        published here, which the client already has. heartbeat_event(data) may
+        turn the last 'session' data into an event to send in place of a bare ping.
+        """
+        deadline = time.monotonic() + self.max_age
+        event, state = initial
+        version = None
+        try:
+            yield f'retry: {self.heartbeat * 1000}\n'
+            yield format_event(event, state)
+            while time.monotonic() < deadline:
+                try:
+                    event, data, published = stream.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    if changed is not None and changed(version):
+                        yield format_event('resync', {})
+                        continue
+                    message = heartbeat_event(state) if heartbeat_event is not None else None
+                    yield format_event(*message) if message else ': ping\n\n'
+                    continue
+                if event == 'session':
+                    state = data
+                if published is not None:
+                    version = published
+                yield format_event(event, data)
+        finally:
+            self.unsubscribe(user_id, stream)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'streams': self._count,
+                'users': len(self._subscribers),
+                'max_streams': self.max_streams,
+                'published': self.published,
+                'rejected': self.rejected,
+                'dropped': self.dropped
+            }
@@ -0,0 +1,107 @@
+"""
+Fast start for scale-to-zero deployments
+Cloud Run starts a fresh instance for the first request after an idle period,
+so everything done at import time is paid by a waiting user. With FAST_START
+set, the app skips the .env lookup and logs JSON lines to stdout (which Cloud
+Run forwards to Cloud Logging) instead of importing the google.cloud.logging
+client. ensure_schema() replaces create_all() at boot: it runs the DDL only
+when the schema marker stored in the database doesn't match the models.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, MetaData, String, Table, delete, insert, select
+from sqlalchemy.exc import DBAPIError
+
+# Bump when DDL that isn't in the model metadata changes (the search index and its triggers)
+SCHEMA_EXTRAS_REVISION = 1
+
+schema_marker = Table(
+    'schema_marker', MetaData(),
+    Column('name', String(50), primary_key=True),
+    Column('version', String(64), nullable=False)
+)
+
+def enabled():
+    return os.environ.get('FAST_START', 'false').lower() == 'true'
+
+def load_environment():
+    """Read .env for local runs; deployed instances get their settings from the environment"""
+    if enabled():
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+
+def schema_version(metadata):
+    """A hash of every table, column and index the models declare"""
+    parts = [f'extras:{SCHEMA_EXTRAS_REVISION}']
+    for table in sorted(metadata.tables.values(), key=lambda table: table.name):
+        parts.append(f'table:{table.name}')
+        for column in table.columns:
+            parts.append(f'column:{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}')
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            where = {key: str(value) for key, value in index.dialect_kwargs.items() if key.endswith('_where')}
+            parts.append(f'index:{index.name}:{[column.name for column in index.columns]}:{index.unique}:{where}')
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+def ensure_schema(db, name='app', create=None):
+    """create_all() only if the stored schema marker is missing or stale; True if DDL ran
+
+    Checking the marker is one primary key lookup, where create_all() inspects
+    every table and index. create replaces db.create_all for apps with DDL that
+    has to run after it. Needs an app context.
+    """
+    version = schema_version(db.metadata)
+    try:
+        with db.engine.connect() as connection:
+            current = connection.execute(
+                select(schema_marker.c.version).where(schema_marker.c.name == name)
+            ).scalar()
+    except DBAPIError:
+        current = None    # no marker table yet
+    if current == version:
+        return False
+
+    (create or db.create_all)()
+    with db.engine.begin() as connection:
+        schema_marker.create(connection, checkfirst=True)
+        connection.execute(delete(schema_marker).where(schema_marker.c.name == name))
+        connection.execute(insert(schema_marker).values(name=name, version=version))
+    return True
+
+class JSONLogFormatter(logging.Formatter):
+    """One JSON object per line in the shape Cloud Logging parses from stdout
+
+    Carries the json_fields and http_request extras the same way the
+    google.cloud.logging handlers do, so log queries work with either.
+    """
+
+    def format(self, record):
+        entry = {
+            'severity': record.levelname,
+            'message': record.getMessage(),
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'logging.googleapis.com/sourceLocation': {
+                'file': record.pathname, 'line': record.lineno, 'function': record.funcName
+            },
+            'logger': record.name
+        }
+        if record.exc_info:
+            entry['message'] += '\n' + self.formatException(record.exc_info)
+        http_request = getattr(record, 'http_request', None)
+        if http_request:
+            entry['httpRequest'] = http_request
+        entry.update(getattr(record, 'json_fields', None) or {})
+        return json.dumps(entry, default=str)
+
+def setup_json_logging(level):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONLogFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic dataset for load and query-plan testing
+Creates users with books and study sessions drawn from realistic distributions
+(a few prolific kids and many casual ones, after-school study times, mostly
+short sessions) and leaves some sessions open, as if the kid is studying now.
+Rows go in with batched executemany inserts, so tens of millions of sessions
+load in minutes, then the leaderboard totals and search index are rebuilt.
+
+    python generate_data.py --users 10000 --books 40 --sessions 1000 --seed 42
+
+The same --seed and --now produce the same rows on every run.
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+
+from app import app, db, create_tables, rebuild_study_totals, to_utc_naive, User, Book, StudySession, SUBJECTS
+from book_search import rebuild_search_index
+
+# Reading is what the app is for; social studies is what kids put off
+SUBJECT_WEIGHTS = {'maths': 20, 'english': 15, 'reading': 35, 'science': 12, 'writing': 10, 'social_studies': 8}
+
+# Local hour a session starts: after school and early evening, some weekend mornings
+WEEKDAY_HOURS = [7, 15, 16, 16, 17, 17, 17, 18, 18, 19, 19, 20]
+WEEKEND_HOURS = [9, 10, 10, 11, 11, 14, 15, 16, 17, 19]
+
+FIRST_NAMES = ['Alex', 'Sam', 'Maya', 'Leo', 'Priya', 'Noah', 'Aria', 'Kai', 'Zoe', 'Omar',
+               'Ella', 'Ravi', 'Lily', 'Finn', 'Anya', 'Theo', 'Ivy', 'Arjun', 'Mia', 'Ben']
+LAST_INITIALS = 'ABCDEFGHJKLMNPRSTW'
+
+TITLE_ADJECTIVES = ['Secret', 'Lost', 'Brave', 'Magic', 'Hidden', 'Little', 'Giant', 'Midnight',
+                    'Silver', 'Wild', 'Curious', 'Forgotten', 'Amazing', 'Tiny', 'Golden']
+TITLE_NOUNS = ['Dragon', 'Garden', 'Wizard', 'Island', 'Robot', 'Castle', 'Detective', 'Forest',
+               'Library', 'Pirate', 'Rocket', 'Unicorn', 'Volcano', 'Treehouse', 'Submarine']
+AUTHORS = ['Roald Dahl', 'Dr. Seuss', 'J.K. Rowling', 'Jeff Kinney', 'Mo Willems', 'Dav Pilkey',
+           'Beverly Cleary', 'E.B. White', 'Judy Blume', 'Rick Riordan', 'Kate DiCamillo',
+           'Mary Pope Osborne', 'Julia Donaldson', 'David Walliams', 'Cressida Cowell']
+SUMMARY_OPENINGS = ['A story about', 'This book is about', 'I read about', 'It was about']
+SUMMARY_SUBJECTS = ['a brave girl', 'a shy dragon', 'two best friends', 'a talking cat', 'a young wizard',
+                    'a family of mice', 'a lost robot', 'a pirate crew', 'a clever detective']
+SUMMARY_PLOTS = ['who goes on a long journey home', 'who finds a hidden door in the library',
+                 'who has to save the castle from a giant', 'who builds a rocket to the moon',
+                 'who solves the mystery of the missing treasure', 'who learns to be kind',
+                 'who gets lost in an enchanted forest', 'who wins the school science fair']
+SUMMARY_ENDINGS = ['I loved the ending!', 'The best part was the funny bits.', 'It was a bit scary.',
+                   'I want to read the next one.', 'My favourite character was the sidekick.', '']
+SESSION_NOTES = ['Times tables', 'Fractions', 'Spelling list', 'Chapter 3', 'Planets', 'Volcanoes',
+                 'Book report', 'Poem', 'Homework', 'Reading log', 'Long division', 'Ancient Egypt']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=1000, help='users to create')
+    parser.add_argument('--books', type=float, default=20, help='average books per user')
+    parser.add_argument('--sessions', type=float, default=200, help='average study sessions per user')
+    parser.add_argument('--active', type=float, default=0.05,
+                        help='fraction of users with an open (in progress) session')
+    parser.add_argument('--days', type=int, default=365, help='history length in days')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, for reproducible datasets')
+    parser.add_argument('--now', type=datetime.fromisoformat, default=None,
+                        help='UTC time the history ends at (default: the current time)')
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows per INSERT batch')
+    return parser.parse_args()
+
+def per_user_count(rng, mean):
+    """A count with the given mean and a long tail: most kids log a little, a few log a lot"""
+    if mean <= 0:
+        return 0
+    return int(rng.gammavariate(1.5, mean / 1.5) + 0.5)
+
+def session_start(rng, now, days):
+    """A start time in the history window, at a time of day kids actually study"""
+    day = now - timedelta(days=int(days * rng.random() ** 1.5))    # denser towards now
+    hours = WEEKEND_HOURS if day.weekday() >= 5 else WEEKDAY_HOURS
+    start = day.replace(hour=rng.choice(hours), minute=rng.randrange(60), second=rng.randrange(60),
+                        microsecond=0)
+    return start if start < now else start - timedelta(days=1)
+
+def session_minutes(rng):
+    """Session length: median about 25 minutes, rarely more than two hours"""
+    return max(1, min(180, int(rng.lognormvariate(math.log(25), 0.6))))
+
+def book_summary(rng):
+    parts = [rng.choice(SUMMARY_OPENINGS), rng.choice(SUMMARY_SUBJECTS), rng.choice(SUMMARY_PLOTS) + '.',
+             rng.choice(SUMMARY_ENDINGS)]
+    return ' '.join(part for part in parts if part)
+
+class BulkLoader:
+    """Buffers rows per table and writes each buffer as one executemany INSERT
+
+    Tables flush in foreign key order, so a session is never written before the
+    book and user it points at.
+    """
+
+    def __init__(self, connection, tables, batch_size):
+        self.connection = connection
+        self.tables = tables
+        self.batch_size = batch_size
+        self.rows = {table.name: [] for table in tables}
+        self.written = {table.name: 0 for table in tables}
+        # SQL Server refuses explicit values for identity columns unless asked
+        self.identity_insert = connection.dialect.name == 'mssql'
+
+    def add(self, table, row):
+        buffer = self.rows[table.name]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        """Write the buffer for table and every table before it (all buffers by default)"""
+        last = self.tables.index(table) if table is not None else len(self.tables) - 1
+        for parent in self.tables[:last + 1]:
+            self._write(parent)
+        self.connection.commit()
+
+    def _write(self, table):
+        buffer = self.rows[table.name]
+        if not buffer:
+            return
+        if self.identity_insert:
+            self.connection.exec_driver_sql(f'SET IDENTITY_INSERT [{table.name}] ON')
+        self.connection.execute(table.insert(), buffer)
+        if self.identity_insert:
+            self.connection.exec_driver_sql(f'SET IDENTITY_INSERT [{table.name}] OFF')
+        self.written[table.name] += len(buffer)
+        self.rows[table.name] = []
+
+def next_id(connection, model):
+    return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+def reset_sequences(connection, models):
+    """PostgreSQL serials don't see explicit ids; move them past the rows we wrote"""
+    if connection.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__table__.name
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT MAX(id) FROM \"{table}\"))"
+        ))
+    connection.commit()
+
+def generate(connection, args, rng, now):
+    user_table, book_table, session_table = User.__table__, Book.__table__, StudySession.__table__
+    loader = BulkLoader(connection, [user_table, book_table, session_table], args.batch_size)
+    user_id, book_id, session_id = (next_id(connection, model) for model in (User, Book, StudySession))
+    began = time.perf_counter()
+
+    for n in range(args.users):
+        joined = now - timedelta(days=args.days, minutes=rng.randrange(7 * 24 * 60))
+        loader.add(user_table, {
+            'id': user_id,
+            'email': f'generated{user_id}@example.com',
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_INITIALS)}.',
+            'google_id': f'generated-{user_id}',
+            'created_at': joined,
+            'is_approved': rng.random() < 0.97,
+            'is_admin': False,
+            'approval_requested_at': joined
+        })
+
+        book_ids = []
+        for _ in range(per_user_count(rng, args.books)):
+            loader.add(book_table, {
+                'id': book_id,
+                'title': f'The {rng.choice(TITLE_ADJECTIVES)} {rng.choice(TITLE_NOUNS)}',
+                'author': rng.choice(AUTHORS),
+                'summary': book_summary(rng),
+                'date_read': session_start(rng, now, args.days),
+                'user_id': user_id
+            })
+            book_ids.append(book_id)
+            book_id += 1
+
+        subjects = rng.choices(SUBJECTS, weights=[SUBJECT_WEIGHTS[s] for s in SUBJECTS],
+                               k=per_user_count(rng, args.sessions))
+        for subject in subjects:
+            start = session_start(rng, now, args.days)
+            minutes = session_minutes(rng)
+            loader.add(session_table, {
+                'id': session_id,
+                'subject': subject,
+                'start_time': start,
+                'end_time': start + timedelta(minutes=minutes),
+                'duration_minutes': minutes,
+                'notes': rng.choice(SESSION_NOTES) if rng.random() < 0.2 else None,
+                'user_id': user_id,
+                'book_id': rng.choice(book_ids) if subject == 'reading' and book_ids else None
+            })
+            session_id += 1
+
+        if rng.random() < args.active:
+            subject = rng.choices(SUBJECTS, weights=[SUBJECT_WEIGHTS[s] for s in SUBJECTS])[0]
+            loader.add(session_table, {
+                'id': session_id,
+                'subject': subject,
+                'start_time': now - timedelta(seconds=rng.randrange(90 * 60)),
+                'end_time': None,
+                'duration_minutes': None,
+                'notes': None,
+                'user_id': user_id,
+                'book_id': rng.choice(book_ids) if subject == 'reading' and book_ids else None
+            })
+            session_id += 1
+
+        user_id += 1
+        if (n + 1) % 1000 == 0:
+            sessions = loader.written[session_table.name]
+            print(f"   {n + 1}/{args.users} users, {sessions} sessions written "
+                  f"({sessions / (time.perf_counter() - began):,.0f} sessions/s)")
+
+    loader.flush()
+    reset_sequences(connection, (User, Book, StudySession))
+    return loader.written
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    now = to_utc_naive(args.now or datetime.now(timezone.utc)).replace(microsecond=0)
+
+    print(f"🎲 Generating {args.users} users (~{args.books:g} books, ~{args.sessions:g} sessions each, "
+          f"seed {args.seed})...")
+
+    try:
+        with app.app_context():
+            create_tables()
+            began = time.perf_counter()
+            with db.engine.connect() as connection:
+                written = generate(connection, args, rng, now)
+            loaded = time.perf_counter() - began
+            print(f"✅ Wrote {written['user']} users, {written['book']} books and "
+                  f"{written['study_session']} sessions in {loaded:.1f}s")
+
+            print("📊 Rebuilding leaderboard totals and the book search index...")
+            rebuild_study_totals()
+            with db.engine.begin() as connection:
+                rebuild_search_index(connection)
+            print(f"✅ Done in {time.perf_counter() - began:.1f}s")
+
+    except Exception as e:
+        print(f"❌ Error generating data: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Group commit for bursts of small writes
+Request threads hand their write to one writer thread, which runs everything that
+arrived within a few milliseconds in a single transaction. On SQLite this turns
+a queue of threads fighting over the database write lock into one commit.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class GroupCommitWriter:
+    """Runs submitted write functions in batched transactions on a single thread
+
+    Each function receives nothing and works through the writer thread's
+    db.session; its return value (plain data, not ORM objects) is handed back
+    to the caller once the batch has committed. Writes run in submission order,
+    so two writes from the same user are applied in the order they arrived.
+    If a batch fails, it is rolled back and each write is retried in its own
+    transaction, so one bad write only fails its own request.
+    """
+
+    def __init__(self, app, db, max_delay=0.005, max_batch=64):
+        self.app = app
+        self.db = db
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.writes = 0
+        self.retried_batches = 0
+
+    def _ensure_thread(self):
+        # Threads don't survive fork, so each gunicorn worker starts its own writer
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def submit(self, write):
+        """Queue a write function; returns a Future that resolves after its batch commits"""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def run(self, write, timeout=30):
+        """Queue a write function and wait for its committed result"""
+        return self.submit(write).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self.app.app_context():
+                try:
+                    self._commit_batch(batch)
+                except Exception as e:
+                    # e.g. the rollback itself failed: no caller may be left waiting
+                    logger.exception('Group commit writer failed a batch')
+                    for write, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                finally:
+                    self.db.session.remove()
+
+    def _commit_batch(self, batch):
+        session = self.db.session
+        results = []
+        try:
+            for write, future in batch:
+                results.append(write())
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            self.retried_batches += 1
+            for write, future in batch:
+                self._commit_one(write, future)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        for (write, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_one(self, write, future):
+        session = self.db.session
+        try:
+            result = write()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += 1
+        future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'writes': self.writes,
+            'writes_per_batch': round(self.writes / self.batches, 2) if self.batches else 0.0,
+            'retried_batches': self.retried_batches,
+            'queued': self._queue.qsize()
+        }
@@ -0,0 +1,82 @@
+"""
+Production gunicorn profile
+gunicorn reads ./gunicorn.conf.py on its own, so `gunicorn app:app` (or
+app_gcp:app) from this directory runs with it. Several worker processes share
+the CPUs instead of one process whose threads take turns holding the GIL.
+The app is imported once in the master before forking (preload_app), so
+workers start fast and share its memory pages; each worker then drops the
+database connections it inherited and opens its own, and the master's pool
+gauges are dropped from the shared metrics.
+
+Workers share one scratch directory for the Prometheus sample files, the
+leaderboard snapshot and the page cache, so invalidations and metrics are
+seen by all of them. WEB_CONCURRENCY and GUNICORN_THREADS override the
+sizing; variables that are already set are left alone.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+
+def available_cpus():
+    """CPUs this process may run on: the affinity mask, capped by a cgroup CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(math.ceil(int(quota) / int(period)), 1))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+bind = f":{os.environ.get('PORT', '8080')}"
+# One worker per CPU: requests here are CPU-bound Python and local SQLite, so extra
+# processes beyond the cores only add switching (threads cover the waits)
+workers = int(os.environ.get('WEB_CONCURRENCY', 0)) or available_cpus()
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+# Cloud Run enforces its own request timeout; 0 also keeps the live timer streams open
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 0))
+# Worker heartbeats go to tmpfs rather than the container's overlay filesystem
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# This file is evaluated before the app is preloaded, so the app sees these settings.
+# A HUP reload evaluates it again in the running master, hence the once-only guard
+if '_GUNICORN_SHARED_DIR' not in os.environ:
+    os.environ['_GUNICORN_SHARED_DIR'] = tempfile.mkdtemp(prefix='reading-tracker-')
+    shared_dir = os.environ['_GUNICORN_SHARED_DIR']
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(shared_dir, 'prometheus'))
+    os.environ.setdefault('SHARED_STATE_DIR', os.path.join(shared_dir, 'state'))
+    # Invalidations must reach every worker's page cache (--workers may raise the count,
+    # and this file can't see it, so it is shared even for a single worker)
+    os.environ.setdefault('USER_CACHE_BACKEND', os.path.join(shared_dir, 'page_cache.db'))
+    # Each stream holds a thread, so leave at least half of them for ordinary requests
+    os.environ.setdefault('SSE_MAX_STREAMS', str(max(threads // 2, 1)))
+
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    os.makedirs(os.environ['SHARED_STATE_DIR'], exist_ok=True)
+    # Samples left over from an earlier run would be summed into this one
+    for name in os.listdir(os.environ['PROMETHEUS_MULTIPROC_DIR']):
+        if name.endswith('.db'):
+            os.unlink(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], name))
+
+def post_fork(server, worker):
+    from db_routing import dispose_inherited_pools
+    from metrics import mark_process_dead
+    dispose_inherited_pools(server.app.wsgi())
+    # Preloading set the pool gauges in the master, which serves no requests but stays
+    # alive, so its live gauge files would be summed into every scrape; drop them
+    mark_process_dead(server.pid)
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+def on_exit(server):
+    shutil.rmtree(os.environ['_GUNICORN_SHARED_DIR'], ignore_errors=True)
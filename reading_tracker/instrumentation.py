@@ -0,0 +1,192 @@
+"""
+Per-request database instrumentation
+Counts the SQL statements each request sends, returns the count in an
+X-DB-Queries response header and keeps running totals per endpoint. In
+development it also counts ORM lazy loads, to catch N+1 query patterns.
+A sample of requests is also timed (SQL, template rendering and the whole
+handler) and reported in a Server-Timing header and a structured log line.
+"""
+
+import logging
+import random
+import threading
+import time
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+class QueryCounter:
+    """Counts database round trips per request and per endpoint"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Listening on the Engine class covers every engine the app creates
+        event.listen(Engine, 'before_cursor_execute', self._count_statement)
+        app.after_request(self._record)
+
+    @staticmethod
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+
+    def _record(self, response):
+        queries = g.get('db_queries', 0)
+        response.headers['X-DB-Queries'] = str(queries)
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, [0, 0])
+            totals[0] += 1
+            totals[1] += queries
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    'requests': requests,
+                    'queries': queries,
+                    'queries_per_request': round(queries / requests, 2)
+                }
+                for endpoint, (requests, queries) in sorted(self._endpoints.items())
+            }
+
+class LazyLoadLimitExceeded(RuntimeError):
+    """A view lazy-loaded more relationships than LAZY_LOAD_LIMIT allows"""
+
+class LazyLoadGuard:
+    """Counts relationship lazy loads per request and flags views that go over a limit
+
+    Off unless LAZY_LOAD_LIMIT is set. Over the limit the view is logged, or with
+    LAZY_LOAD_RAISE the offending query raises, so tests fail on an N+1 pattern.
+    """
+
+    def __init__(self, app=None):
+        self.limit = None
+        self.raise_on_limit = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.limit = app.config.get('LAZY_LOAD_LIMIT')
+        self.raise_on_limit = app.config.get('LAZY_LOAD_RAISE', False)
+        if self.limit is None:
+            return
+        event.listen(Session, 'do_orm_execute', self._count_lazy_load)
+        app.after_request(self._record)
+
+    def _count_lazy_load(self, orm_execute_state):
+        if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None or not has_request_context():
+            return
+        g.lazy_loads = g.get('lazy_loads', 0) + 1
+        if self.raise_on_limit and g.lazy_loads > self.limit:
+            raise LazyLoadLimitExceeded(
+                f"{request.endpoint} lazy-loaded {g.lazy_loads} relationships "
+                f"(limit {self.limit}); the last was from {orm_execute_state.lazy_loaded_from.object!r}. "
+                f"Load it with selectinload()/joinedload() or select the columns the template needs."
+            )
+
+    def _record(self, response):
+        lazy_loads = g.get('lazy_loads', 0)
+        response.headers['X-Lazy-Loads'] = str(lazy_loads)
+        if lazy_loads > self.limit:
+            logger.warning(f"{request.endpoint} lazy-loaded {lazy_loads} relationships (limit {self.limit})")
+        return response
+
+class RequestTimer:
+    """Times where a sampled request spends its time: SQL, template rendering and the whole handler
+
+    REQUEST_TIMING_SAMPLE_RATE of requests (0 to 1) are timed; the rest pay one
+    random() call. A timed request gets a Server-Timing header, which browser dev
+    tools show next to the network timings, and one log line whose json_fields
+    google.cloud.logging turns into searchable jsonPayload fields. SQL time is
+    time spent executing statements; fetching rows counts towards the handler.
+    """
+
+    def __init__(self, app=None):
+        self.sample_rate = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = float(app.config.get('REQUEST_TIMING_SAMPLE_RATE') or 0.0)
+        if self.sample_rate <= 0:
+            return
+        # Engine-wide listeners, shared by every timer and added once
+        if not event.contains(Engine, 'before_cursor_execute', RequestTimer._query_started):
+            event.listen(Engine, 'before_cursor_execute', RequestTimer._query_started)
+            event.listen(Engine, 'after_cursor_execute', RequestTimer._query_finished)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        app.before_request(self._start)
+        app.after_request(self._record)
+
+    def _start(self):
+        if random.random() < self.sample_rate:
+            g.timing = {'started': time.perf_counter(), 'queries': 0, 'db': 0.0, 'render': 0.0}
+
+    @staticmethod
+    def _timing():
+        return g.get('timing') if has_request_context() else None
+
+    @staticmethod
+    def _query_started(conn, cursor, statement, parameters, context, executemany):
+        if RequestTimer._timing() is not None:
+            conn.info['timing_query_started'] = time.perf_counter()
+
+    @staticmethod
+    def _query_finished(conn, cursor, statement, parameters, context, executemany):
+        timing = RequestTimer._timing()
+        started = conn.info.pop('timing_query_started', None)
+        if timing is not None and started is not None:
+            timing['queries'] += 1
+            timing['db'] += time.perf_counter() - started
+
+    def _render_started(self, sender, template, context, **extra):
+        timing = self._timing()
+        if timing is not None:
+            timing['render_started'] = time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        timing = self._timing()
+        if timing is not None and 'render_started' in timing:
+            timing['render'] += time.perf_counter() - timing.pop('render_started')
+
+    def _record(self, response):
+        timing = g.pop('timing', None)
+        if timing is None:
+            return response
+        total_ms = (time.perf_counter() - timing['started']) * 1000
+        db_ms = timing['db'] * 1000
+        render_ms = timing['render'] * 1000
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{timing["queries"]} queries", '
+            f'render;dur={render_ms:.1f}, app;dur={total_ms:.1f}'
+        )
+        logger.info(
+            f"{request.method} {request.path} {response.status_code} in {total_ms:.1f}ms "
+            f"({timing['queries']} queries, {db_ms:.1f}ms SQL, {render_ms:.1f}ms render)",
+            extra={
+                'json_fields': {
+                    'endpoint': request.endpoint,
+                    'db_queries': timing['queries'],
+                    'db_ms': round(db_ms, 2),
+                    'render_ms': round(render_ms, 2),
+                    'total_ms': round(total_ms, 2),
+                    'sample_rate': self.sample_rate
+                },
+                'http_request': {
+                    'requestMethod': request.method,
+                    'requestUrl': request.full_path.rstrip('?'),
+                    'status': response.status_code
+                }
+            }
+        )
+        return response
@@ -5,13 +5,14 @@ Handles both development and production environments
 """
 
 import os
-from app import app, db
+from app import app, db, create_tables
+from fast_start import ensure_schema
 
 def main():
     """Main entry point for the application"""
-    # Initialize database tables
+    # Initialize database tables (skipped when the schema marker is current)
     with app.app_context():
-        db.create_all()
+        ensure_schema(db, create=create_tables)
     
     # Get port from environment (Azure sets this automatically)
     port = int(os.environ.get('PORT', 5000))
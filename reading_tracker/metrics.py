@@ -0,0 +1,197 @@
+"""
+Prometheus metrics for /metrics
+Route latency histograms, in-flight requests, SQLAlchemy connection pool
+gauges, cache hit ratios and open study sessions. Under gunicorn, point
+PROMETHEUS_MULTIPROC_DIR at an empty directory shared by the workers: each
+worker then writes its samples to memory-mapped files there, and a scrape
+served by any worker reports the totals for all of them.
+"""
+
+import logging
+import os
+import threading
+import time
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                                   generate_latest, multiprocess)
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:    # metrics are optional; /metrics answers 404 without the package
+    multiprocess = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges; call from gunicorn's child_exit hook"""
+    if multiprocess is not None and multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
+
+class _Families:
+    """A collector-like wrapper so generate_latest can render an already collected list"""
+
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return self.families
+
+class Metrics:
+    """Records request, pool and cache metrics and renders them in the Prometheus text format
+
+    engines maps a label to a callable returning an Engine (or None), caches maps
+    a label to an object with stats() hits/misses, and active_sessions is a
+    callable counting open study sessions; the last two are read per request and
+    per scrape respectively, inside the request's app context.
+    """
+
+    def __init__(self, app=None, **kwargs):
+        self.enabled = False
+        if app is not None:
+            self.init_app(app, **kwargs)
+
+    def init_app(self, app, engines=None, caches=None, active_sessions=None):
+        if multiprocess is None:
+            logger.warning('prometheus_client is not installed; /metrics is disabled')
+            return
+        self.enabled = True
+        self.token = app.config.get('METRICS_TOKEN')
+        self.caches = caches or {}
+        self.active_sessions = active_sessions
+        self._cache_seen = {}
+        self._cache_seen_lock = threading.Lock()
+        self._engine_labels = {}
+
+        # In multiprocess mode the values live in the shared files, not in a registry
+        self.multiprocess = bool(multiprocess_dir())
+        self.registry = None if self.multiprocess else CollectorRegistry()
+        registry = self.registry
+
+        self.latency = Histogram('http_request_duration_seconds', 'Request latency by route',
+                                 ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS, registry=registry)
+        self.in_progress = Gauge('http_requests_in_progress', 'Requests being handled',
+                                 multiprocess_mode='livesum', registry=registry)
+        self.pool_checked_out = Gauge('db_pool_checked_out', 'Pooled connections in use',
+                                      ['engine'], multiprocess_mode='livesum', registry=registry)
+        self.pool_overflow = Gauge('db_pool_overflow', 'Connections open beyond pool_size (negative: unused slots)',
+                                   ['engine'], multiprocess_mode='livesum', registry=registry)
+        self.pool_size = Gauge('db_pool_size', 'Configured pool_size', ['engine'],
+                               multiprocess_mode='livesum', registry=registry)
+        self.connection_wait = Histogram('db_connection_wait_seconds',
+                                         'Time a session waited to get a connection from the pool',
+                                         ['engine'], buckets=LATENCY_BUCKETS, registry=registry)
+        self.cache_lookups = Counter('cache_lookups', 'Cache lookups by result (hit, shared_hit, miss)',
+                                     ['cache', 'result'], registry=registry)
+
+        with app.app_context():
+            for label, engine in (engines or {}).items():
+                engine = engine()
+                if engine is not None:
+                    self._watch_pool(label, engine)
+        event.listen(Session, 'do_orm_execute', self._before_connection)
+        event.listen(Session, 'before_flush', self._before_connection)
+        event.listen(Session, 'after_begin', self._connection_acquired)
+
+        app.before_request(self._start)
+        app.after_request(self._record)
+        app.teardown_request(self._finish)
+        app.extensions['metrics'] = self
+
+    def _watch_pool(self, label, engine):
+        self._engine_labels[engine] = label
+
+        def update(*args):
+            pool = engine.pool    # engine.dispose() swaps in a new pool with the same listeners
+            if hasattr(pool, 'checkedout'):
+                self.pool_checked_out.labels(label).set(pool.checkedout())
+                self.pool_overflow.labels(label).set(pool.overflow())
+                self.pool_size.labels(label).set(pool.size())
+
+        event.listen(engine, 'checkout', update)
+        event.listen(engine, 'checkin', update)
+        update()
+
+    # A session fetches its connection right after an execute or flush starts,
+    # so the time from there to after_begin is the wait for the pool
+    @staticmethod
+    def _before_connection(session_or_state, *args):
+        session = getattr(session_or_state, 'session', session_or_state)
+        session.info['metrics_connection_requested'] = time.perf_counter()
+
+    def _connection_acquired(self, session, transaction, connection):
+        requested = session.info.pop('metrics_connection_requested', None)
+        label = self._engine_labels.get(connection.engine)
+        if requested is not None and label is not None:
+            self.connection_wait.labels(label).observe(time.perf_counter() - requested)
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+        self.in_progress.inc()
+
+    def _record(self, response):
+        started = g.get('metrics_started')
+        if started is not None:
+            self.latency.labels(request.endpoint or 'unmatched', request.method,
+                                str(response.status_code)).observe(time.perf_counter() - started)
+        self._count_cache_lookups()
+        return response
+
+    def _finish(self, exc):
+        if g.pop('metrics_started', None) is not None:
+            self.in_progress.dec()
+
+    def _count_cache_lookups(self):
+        # The caches keep running totals; add what changed since this worker last looked.
+        # Every request thread does this, so one at a time, or two would add the same change
+        with self._cache_seen_lock:
+            for label, cache in self.caches.items():
+                stats = cache.stats()
+                for result, key in (('hit', 'hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses')):
+                    value = stats.get(key, 0)
+                    seen = self._cache_seen.get((label, result), 0)
+                    if value > seen:
+                        self.cache_lookups.labels(label, result).inc(value - seen)
+                        self._cache_seen[(label, result)] = value
+
+    def authorized(self):
+        """With METRICS_TOKEN set, scrapes must send it as a bearer token"""
+        return not self.token or request.headers.get('Authorization') == f'Bearer {self.token}'
+
+    def exposition(self):
+        """(body, content type) for a scrape, covering every worker in multiprocess mode"""
+        self._count_cache_lookups()
+        if self.multiprocess:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = self.registry
+        families = list(registry.collect())
+        families.extend(self._scrape_families(families))
+        return generate_latest(_Families(families)), CONTENT_TYPE_LATEST
+
+    def _scrape_families(self, families):
+        """Values computed per scrape: hit ratios from the summed counters, and the open sessions"""
+        lookups = {}
+        for family in families:
+            if family.name == 'cache_lookups':
+                for sample in family.samples:
+                    if sample.name == 'cache_lookups_total':
+                        totals = lookups.setdefault(sample.labels['cache'], [0.0, 0.0])
+                        totals[1] += sample.value
+                        if sample.labels['result'] != 'miss':
+                            totals[0] += sample.value
+        ratio = GaugeMetricFamily('cache_hit_ratio', 'Share of cache lookups served from cache', labels=['cache'])
+        for label, (hits, total) in sorted(lookups.items()):
+            ratio.add_metric([label], hits / total if total else 0.0)
+        yield ratio
+
+        if self.active_sessions is not None:
+            yield GaugeMetricFamily('study_sessions_active', 'Study sessions currently in progress',
+                                    value=self.active_sessions())
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Rebuild the leaderboard totals from the study_session table and the book search index
+Run this after upgrading an existing database or if the totals drift
+"""
+
+import sys
+from app import app, db, create_tables, rebuild_study_totals
+from book_search import rebuild_search_index
+
+def main():
+    print("📊 Rebuilding leaderboard totals...")
+    
+    try:
+        with app.app_context():
+            create_tables()
+            users = rebuild_study_totals()
+            with db.engine.begin() as connection:
+                rebuild_search_index(connection)
+        print(f"✅ Rebuilt totals for {users} users")
+        print("🔍 Rebuilt the book search index")
+        
+    except Exception as e:
+        print(f"❌ Error rebuilding totals: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Role resolution for sign-in
+Configured role addresses (ADMIN_EMAILS, and any other role a deployment adds)
+are parsed once into case-folded frozensets, so checking a login is a set
+lookup however many addresses are configured. Resolved roles are cached per
+address, and the whole table is replaced when the configuration changes.
+"""
+
+from cache import LRUCache
+
+def normalize_email(email):
+    return (email or '').strip().casefold()
+
+def parse_emails(value):
+    """Case-folded addresses from a comma-separated string or an iterable of addresses"""
+    if isinstance(value, str):
+        value = value.split(',')
+    return frozenset(normalize_email(email) for email in value or () if normalize_email(email))
+
+class RoleResolver:
+    """Maps an email address to the frozenset of roles configured for it"""
+
+    def __init__(self, roles=None, cache_size=4096):
+        self.cache_size = cache_size
+        self.update(roles or {})
+
+    def update(self, roles):
+        """Replace the role table with {role: addresses}"""
+        table = {role: parse_emails(emails) for role, emails in roles.items()}
+        # One assignment, so a concurrent lookup sees the old table or the new one, never a mix
+        self._state = (table, LRUCache(self.cache_size))
+
+    def roles(self, email):
+        table, cache = self._state
+        key = normalize_email(email)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(role for role, emails in table.items() if key in emails)
+            cache.set(key, roles)
+        return roles
+
+    def has_role(self, email, role):
+        return role in self.roles(email)
+
+    def is_admin(self, email):
+        return self.has_role(email, 'admin')
+
+    def stats(self):
+        table, cache = self._state
+        return {'addresses': {role: len(emails) for role, emails in table.items()}, 'cache': cache.stats()}
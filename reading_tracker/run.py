@@ -32,9 +32,10 @@ def check_requirements():
 def check_database():
     """Check if database connection is working"""
     try:
-        from app import app, db
+        from app import app, db, create_tables
+        from fast_start import ensure_schema
         with app.app_context():
-            db.create_all()
+            ensure_schema(db, create=create_tables)
         print("✅ Database connection successful")
         return True
     except Exception as e:
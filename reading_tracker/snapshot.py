@@ -0,0 +1,190 @@
+"""
+Leaderboard snapshots shared by gunicorn workers
+The all-time leaderboard looks the same to every visitor, so instead of each
+worker ranking it per request, whichever worker first finds the snapshot stale
+writes it to a file of fixed-size records and every worker memory-maps that
+file. The rows live once in the OS page cache and a request decodes only the
+rows on its page, and finding one user's row is a binary search over an index
+sorted by user id. A new snapshot is written in a background thread to a
+temporary file and renamed over the old one, so requests keep serving the old
+file meanwhile and readers always map a complete file (POSIX rename semantics;
+the gunicorn profile is the only thing that turns this on).
+"""
+
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:    # no advisory locks on Windows; each stale worker rebuilds on its own
+    fcntl = None
+
+MAGIC = b'RTLB0002'
+HEADER = struct.Struct('<8sdQQQ')   # magic, built_at, row count, offset of the user index, offset of the name bytes
+ROW = struct.Struct('<qqqQI')       # user id, total minutes, rank, name offset, name length
+INDEX = struct.Struct('<qQ')        # user id, row position; sorted by user id
+
+logger = logging.getLogger(__name__)
+
+def write_snapshot(path, rows, built_at=None):
+    """Write (user_id, name, total_minutes) rows, best first, to path; ties share a rank
+
+    Rows are written as they arrive, so rows can be a streamed query result;
+    only the user index and the names are held until the end.
+    """
+    built_at = time.time() if built_at is None else built_at
+    index, names = [], bytearray()
+    previous = None
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.snapshot-')
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.seek(HEADER.size)    # the header needs the row count; it goes in last
+            for position, (user_id, name, total_minutes) in enumerate(rows):
+                rank = previous[1] if previous and previous[0] == total_minutes else position + 1
+                previous = (total_minutes, rank)
+                encoded = (name or '').encode()
+                f.write(ROW.pack(user_id, total_minutes, rank, len(names), len(encoded)))
+                index.append((user_id, position))
+                names += encoded
+
+            index.sort()
+            index_offset = HEADER.size + ROW.size * len(index)
+            f.write(b''.join(INDEX.pack(*entry) for entry in index))
+            f.write(names)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, built_at, len(index), index_offset, index_offset + INDEX.size * len(index)))
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return len(index)
+
+class Board:
+    """One mapped snapshot; stays readable after a newer one replaces the file"""
+
+    def __init__(self, view, entry):
+        self._view = view
+        self._entry = entry
+        _, self.built_at, self.count, self._index_offset, self._names_offset = HEADER.unpack_from(view)
+
+    def __len__(self):
+        return self.count
+
+    def row(self, position):
+        user_id, total_minutes, rank, name_offset, name_length = \
+            ROW.unpack_from(self._view, HEADER.size + position * ROW.size)
+        start = self._names_offset + name_offset
+        name = self._view[start:start + name_length].decode()
+        return self._entry((user_id, name, total_minutes, rank))
+
+    def page(self, page, per_page):
+        start = (page - 1) * per_page
+        return [self.row(position) for position in range(start, min(start + per_page, self.count))]
+
+    def find(self, user_id):
+        """One user's row, or None if they are not on this board"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            found, position = INDEX.unpack_from(self._view, self._index_offset + middle * INDEX.size)
+            if found == user_id:
+                return self.row(position)
+            if found < user_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+class LeaderboardSnapshot:
+    """A ranked leaderboard file at path, rebuilt at most every max_age seconds
+
+    entry turns a (user_id, name, total_minutes, rank) tuple into whatever the
+    caller's views expect, e.g. a namedtuple's _make. build runs in a background
+    thread, so it must set up its own app context and database session.
+    """
+
+    def __init__(self, path, max_age=5, entry=tuple):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_age = max_age
+        self.entry = entry
+        self._board = (None, None)    # (file identity, Board), replaced in one assignment
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.rebuilds = 0
+        self.remaps = 0
+        self.busy = 0
+
+    def current(self):
+        """The newest snapshot on disk, or None if none has been written yet"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        identity, board = self._board
+        if identity != (stat.st_dev, stat.st_ino):
+            with open(self.path, 'rb') as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if view[:len(MAGIC)] != MAGIC:
+                return None
+            # The old mapping is unmapped once the last request reading it lets go
+            board = Board(view, self.entry)
+            self._board = ((stat.st_dev, stat.st_ino), board)
+            self.remaps += 1
+        return board
+
+    def get(self, build):
+        """The current snapshot, starting a rebuild from build()'s rows if it is stale
+
+        The rebuild runs in a background thread, one per process, and only one
+        worker rebuilds at a time; requests keep serving the stale snapshot
+        meanwhile. Returns None while no snapshot exists yet.
+        """
+        board = self.current()
+        if board is None or time.time() - board.built_at > self.max_age:
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._rebuild, args=(build,),
+                                                    name='leaderboard-snapshot', daemon=True)
+                    self._thread.start()
+        return board
+
+    def wait(self, timeout=None):
+        """Wait for a rebuild this process started to finish"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _rebuild(self, build):
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self.busy += 1
+                    return
+            # Another worker may have finished a rebuild just before this one took the lock
+            board = self.current()
+            if board is not None and time.time() - board.built_at <= self.max_age:
+                return
+            try:
+                write_snapshot(self.path, build())
+            except Exception:
+                logger.exception('Leaderboard snapshot rebuild failed; serving the previous one')
+                return
+            self.rebuilds += 1
+
+    def stats(self):
+        _, board = self._board
+        return {
+            'rows': len(board) if board is not None else None,
+            'age_seconds': round(time.time() - board.built_at, 1) if board is not None else None,
+            'rebuilds': self.rebuilds,
+            'remaps': self.remaps,
+            'busy': self.busy
+        }
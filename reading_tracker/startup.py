@@ -6,17 +6,20 @@ This script ensures proper initialization on Azure deployment
 
 import os
 import sys
-from app import app, db
+from app import app, db, create_tables
+from fast_start import ensure_schema
 
 def main():
     """Initialize the application for Azure deployment"""
     print("🚀 Initializing Reading & Study Tracker on Azure...")
     
     try:
-        # Create database tables if they don't exist
+        # Create database tables unless the schema marker shows they are current
         with app.app_context():
-            db.create_all()
-            print("✅ Database tables created/verified")
+            if ensure_schema(db, create=create_tables):
+                print("✅ Database tables created/verified")
+            else:
+                print("✅ Database schema is current")
         
         print("✅ Application initialized successfully")
         return app
@@ -113,9 +113,9 @@ class StudyTimer {
 // Global timer instance
 const studyTimer = new StudyTimer();
 
-// Check for active session on page load
+// Follow the session state on page load
 document.addEventListener('DOMContentLoaded', function() {
-    checkActiveSession();
+    connectStudyEvents();
     
     // Add click handlers for study buttons
     const studyButtons = document.querySelectorAll('[data-subject]');
@@ -127,24 +127,92 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-// Check if there's an active study session
+// Session state pushed by the server over /study/events, with polling as the fallback
+const SESSION_POLL_INTERVAL = 30000;
+let studyEvents = null;
+let sessionPollTimer = null;
+let knownSessionId;              // undefined until the first state arrives
+let studyActionInProgress = false; // this tab reloads itself after start/stop
+
+function connectStudyEvents() {
+    if (!window.EventSource) {
+        startSessionPolling();
+        return;
+    }
+    
+    studyEvents = new EventSource('/study/events');
+    studyEvents.addEventListener('session', event => applySessionState(JSON.parse(event.data)));
+    studyEvents.addEventListener('elapsed', event => {
+        const data = JSON.parse(event.data);
+        if (studyTimer.isActive() && data.session_id === knownSessionId) {
+            studyTimer.startTime = new Date(Date.now() - data.elapsed_seconds * 1000);
+        }
+    });
+    studyEvents.addEventListener('resync', () => checkActiveSession());
+    studyEvents.onerror = () => {
+        // EventSource reconnects by itself after the server ends a stream; a refused
+        // stream (server busy, or not logged in) is closed for good, so poll instead
+        if (studyEvents.readyState === EventSource.CLOSED) {
+            studyEvents = null;
+            startSessionPolling();
+        }
+    };
+}
+
+function startSessionPolling() {
+    if (sessionPollTimer) return;
+    checkActiveSession().then(ok => {
+        if (ok) {
+            sessionPollTimer = setInterval(checkActiveSession, SESSION_POLL_INTERVAL);
+        }
+    });
+}
+
+// Free the server's stream thread as soon as the page goes away
+window.addEventListener('pagehide', () => {
+    if (studyEvents) {
+        studyEvents.close();
+        studyEvents = null;
+    }
+});
+
+// Check if there's an active study session; resolves to false when the endpoint is unavailable
 function checkActiveSession() {
-    fetch('/study/current')
+    return fetch('/study/current')
         .then(response => response.json())
         .then(data => {
-            if (data.active) {
-                const startTime = new Date(data.start_time);
-                studyTimer.start(startTime);
-                
-                // Show active session UI if elements exist
-                showActiveSessionUI(data.subject, data.elapsed_seconds);
-            }
+            applySessionState(data);
+            return true;
         })
         .catch(error => {
             console.log('No active session check endpoint available');
+            return false;
         });
 }
 
+// Bring the timer in line with the server's session state
+function applySessionState(data) {
+    const sessionId = data.active ? data.session_id : null;
+    const changed = knownSessionId !== undefined && sessionId !== knownSessionId;
+    knownSessionId = sessionId;
+    
+    if (data.active) {
+        if (!studyTimer.isActive() || changed) {
+            studyTimer.start(new Date(Date.now() - data.elapsed_seconds * 1000));
+        }
+        
+        // Show active session UI if elements exist
+        showActiveSessionUI(data.subject, data.elapsed_seconds);
+    } else {
+        studyTimer.stop();
+    }
+    
+    // A session was started or stopped in another tab: re-render this one to match
+    if (changed && !studyActionInProgress) {
+        location.reload();
+    }
+}
+
 // Show active session UI elements
 function showActiveSessionUI(subject, elapsedSeconds) {
     // This function can be customized based on the page
@@ -162,6 +230,7 @@ function startStudySession(subject) {
     // Send browser's current time to server
     const now = new Date();
     formData.append('start_time', now.toISOString());
+    studyActionInProgress = true;
     
     // Show loading state
     const startButton = document.querySelector(`[data-subject="${subject}"]`);
@@ -213,10 +282,12 @@ function startStudySession(subject) {
                 location.reload();
             }, 1500);
         } else {
+            studyActionInProgress = false;
             showNotification('Failed to start study session', 'error');
         }
     })
     .catch(error => {
+        studyActionInProgress = false;
         console.error('Error starting study session:', error);
         showNotification('Failed to start study session', 'error');
     });
@@ -232,6 +303,7 @@ function stopStudySession(notes = '') {
     // Send browser's current time to server
     const now = new Date();
     formData.append('end_time', now.toISOString());
+    studyActionInProgress = true;
     
     fetch('/study/stop', {
         method: 'POST',
@@ -251,10 +323,12 @@ function stopStudySession(notes = '') {
                 location.reload();
             }, 2000);
         } else {
+            studyActionInProgress = false;
             showNotification('Failed to stop study session', 'error');
         }
     })
     .catch(error => {
+        studyActionInProgress = false;
         console.error('Error stopping study session:', error);
         showNotification('Failed to stop study session', 'error');
     });
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test that the one-round-trip dashboard loader returns what the separate
+per-list queries it replaced return, including for a user with nothing yet
+"""
+
+from datetime import datetime, timedelta
+
+from app import app, db, Book, StudySession, BookRef, BookSummary, SessionSummary, load_dashboard_data
+
+def book_summary(book):
+    return BookSummary(book.id, book.title, book.author, book.date_read)
+
+def session_summary(session):
+    book = BookRef(session.book.id, session.book.title) if session.book else None
+    return SessionSummary(session.id, session.subject, session.start_time, session.end_time,
+                          session.duration_minutes, session.notes, book)
+
+def separate_queries(user_id, session_limit):
+    """The queries the dashboard and study pages ran before load_dashboard_data"""
+    finished = StudySession.query.filter_by(user_id=user_id).filter(StudySession.end_time.isnot(None))\
+        .order_by(StudySession.start_time.desc())
+    active = StudySession.query.filter_by(user_id=user_id, end_time=None).first()
+    return (
+        tuple(book_summary(book) for book in Book.query.filter_by(user_id=user_id).order_by(Book.title.asc())),
+        tuple(book_summary(book) for book in
+              Book.query.filter_by(user_id=user_id).order_by(Book.date_read.desc()).limit(5)),
+        tuple(session_summary(session) for session in
+              (finished.limit(session_limit) if session_limit is not None else finished)),
+        session_summary(active) if active else None
+    )
+
+def loaded(user_id, session_limit):
+    data = load_dashboard_data(user_id, session_limit)
+    return data.user_books, data.recent_books, data.recent_sessions, data.active_session
+
+def test_matches_the_separate_queries(user):
+    start = datetime(2024, 3, 1, 16, 0)
+    with app.app_context():
+        books = [Book(title=title, author='Author', user_id=user, date_read=start - timedelta(days=days))
+                 for days, title in enumerate(['Matilda', 'Holes', 'Wonder', 'Coraline', 'Frindle', 'Hatchet',
+                                               'Redwall'])]
+        db.session.add_all(books)
+        db.session.flush()
+        for i in range(8):
+            begun = start - timedelta(hours=3 * i)
+            db.session.add(StudySession(subject='reading' if i % 2 else 'maths', user_id=user, start_time=begun,
+                                        end_time=begun + timedelta(minutes=25), duration_minutes=25,
+                                        notes=f'Session {i}', book_id=books[i % 7].id if i % 2 else None))
+        db.session.add(StudySession(subject='reading', user_id=user, start_time=start + timedelta(hours=1),
+                                    book_id=books[0].id))
+        db.session.commit()
+
+        for session_limit in (5, None):
+            assert loaded(user, session_limit) == separate_queries(user, session_limit)
+        assert loaded(user, None)[3].book == BookRef(books[0].id, 'Matilda')
+
+def test_a_user_with_no_books_or_sessions(user):
+    with app.app_context():
+        assert loaded(user, 5) == separate_queries(user, 5) == ((), (), (), None)
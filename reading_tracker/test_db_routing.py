@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test the SQLite connection settings and read routing: read-only views read from
+the read-only pool or the replica, except that a user who just wrote keeps
+reading from the primary until their sticky window expires, on every device.
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import jsonify, session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+import db_routing
+from cache import SQLiteCacheBackend, UserCache
+from db_routing import DatabaseRouter, RoutingSession, read_only_view
+
+@pytest.fixture
+def app(make_sqlite_app, tmp_path):
+    """An app whose primary and replica are separate files that each know their own name"""
+    urls = {name: f'sqlite:///{tmp_path / name}.db' for name in ('primary', 'replica')}
+    for name, url in urls.items():
+        with create_engine(url).begin() as connection:
+            connection.execute(text('CREATE TABLE source (name TEXT)'))
+            connection.execute(text('INSERT INTO source VALUES (:name)'), {'name': name})
+
+    app, db, _ = make_sqlite_app('primary.db', session_options={'class_': RoutingSession}, SECRET_KEY='test',
+                                 DATABASE_REPLICA_URL=urls['replica'], REPLICA_STICKY_SECONDS=10)
+    router = DatabaseRouter(app, db)
+    router.track_writers(UserCache((), backend=SQLiteCacheBackend(str(tmp_path / 'shared.db'))),
+                         writer_id=lambda: session.get('_user_id'))
+
+    @app.route('/source')
+    @read_only_view
+    def source():
+        return jsonify(db.session.execute(text('SELECT name FROM source')).scalar())
+
+    @app.route('/write', methods=['POST'])
+    def write():
+        db.session.execute(text('UPDATE source SET name = name'))
+        db.session.commit()
+        return jsonify(True)
+
+    return app
+
+def test_reads_stick_to_the_primary_until_the_cookie_expires(app, monkeypatch):
+    client = app.test_client()
+    now = [time.time()]
+    monkeypatch.setattr(db_routing, 'time', SimpleNamespace(time=lambda: now[0]))
+
+    assert client.get('/source').get_json() == 'replica'
+    assert client.post('/write').status_code == 200
+    assert client.get('/source').get_json() == 'primary'
+
+    now[0] += 9
+    assert client.get('/source').get_json() == 'primary'
+    assert app.test_client().get('/source').get_json() == 'replica'   # other users are unaffected
+
+    now[0] += 2
+    assert client.get('/source').get_json() == 'replica'
+
+def logged_in(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['_user_id'] = user_id
+    return client
+
+def test_a_users_other_devices_read_from_the_primary_after_they_write(app, tmp_path, monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(db_routing, 'time', SimpleNamespace(time=lambda: now[0]))
+
+    assert logged_in(app, '7').post('/write').status_code == 200
+    phone = logged_in(app, '7')       # no sticky cookie of its own
+    assert phone.get('/source').get_json() == 'primary'
+    assert logged_in(app, '8').get('/source').get_json() == 'replica'
+
+    now[0] += 11
+    assert phone.get('/source').get_json() == 'replica'
+
+    # a write handled by another worker pins the user here too
+    other_worker = UserCache((), backend=SQLiteCacheBackend(str(tmp_path / 'shared.db')))
+    other_worker.extend_deadline('7', 'db_primary', now[0] + 10)
+    assert phone.get('/source').get_json() == 'primary'
+
+def test_sqlite_connections_are_tuned_and_the_read_pool_is_read_only(make_sqlite_app):
+    app, db, Note = make_sqlite_app(session_options={'class_': RoutingSession})
+    router = DatabaseRouter(app, db)
+
+    @app.route('/engine')
+    @read_only_view
+    def read_only():
+        return jsonify(db.session.get_bind() is router.reader)
+
+    @app.route('/engine', methods=['POST'])
+    def writable():
+        return jsonify(db.session.get_bind() is router.reader)
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as connection:
+            pragma = lambda name: connection.execute(text(f'PRAGMA {name}')).scalar()
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('busy_timeout') == 5000
+            assert pragma('synchronous') == 1    # NORMAL
+            assert pragma('query_only') == 0
+
+    with router.reader.connect() as connection:
+        assert connection.execute(text('PRAGMA query_only')).scalar() == 1
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        with pytest.raises(OperationalError, match='readonly'):
+            connection.execute(text("INSERT INTO note (text) VALUES ('nope')"))
+
+    client = app.test_client()
+    assert client.get('/engine').get_json() is True
+    assert client.post('/engine').get_json() is False
+
+def test_the_apps_read_only_views_query_the_read_pool(user, client_for):
+    from app import db_router
+
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db_router.reader, 'before_cursor_execute', capture)
+    try:
+        assert client_for(user).get('/leaderboard').status_code == 200
+    finally:
+        event.remove(db_router.reader, 'before_cursor_execute', capture)
+    assert any('user_study_totals' in statement for statement in statements)
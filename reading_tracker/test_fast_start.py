@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test the schema marker that lets boots skip create_all, and the Cloud Run JSON log format
+"""
+
+import json
+import logging
+
+from sqlalchemy import event
+
+from fast_start import JSONLogFormatter, ensure_schema, schema_version
+
+def count_ddl(engine, statements):
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('CREATE', 'PRAGMA MAIN.TABLE_INFO')):
+            statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', capture)
+
+def test_schema_ddl_runs_only_when_the_models_change(make_sqlite_app):
+    app, db, _ = make_sqlite_app()
+    with app.app_context():
+        assert ensure_schema(db) is True
+
+        statements = []
+        count_ddl(db.engine, statements)
+        assert ensure_schema(db) is False
+        assert statements == []
+
+        # A new column changes the version, so the next boot runs create_all again
+        before = schema_version(db.metadata)
+        db.metadata.tables['note'].append_column(db.Column('author', db.String(50)))
+        assert schema_version(db.metadata) != before
+        assert ensure_schema(db) is True
+        assert statements
+
+def test_a_custom_create_runs_after_create_all_has_committed(make_sqlite_app):
+    app, db, _ = make_sqlite_app()
+    calls = []
+    def create():
+        db.create_all()
+        # Full-text DDL on SQL Server has to run on its own autocommit connection like this
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            calls.append(connection.execute(db.text("SELECT count(*) FROM note")).scalar())
+
+    with app.app_context():
+        assert ensure_schema(db, create=create) is True
+        assert ensure_schema(db, create=create) is False
+    assert calls == [0]
+
+def test_json_log_lines_carry_structured_fields():
+    record = logging.LogRecord('instrumentation', logging.INFO, __file__, 10, 'GET /books 200 in 5.0ms', None, None)
+    record.json_fields = {'endpoint': 'books', 'db_queries': 2}
+    record.http_request = {'requestMethod': 'GET', 'status': 200}
+
+    entry = json.loads(JSONLogFormatter().format(record))
+
+    assert entry['severity'] == 'INFO'
+    assert entry['message'] == 'GET /books 200 in 5.0ms'
+    assert entry['endpoint'] == 'books' and entry['db_queries'] == 2
+    assert entry['httpRequest'] == {'requestMethod': 'GET', 'status': 200}
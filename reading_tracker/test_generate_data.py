@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test the load-test data generator: rows are reproducible from the seed, land in
+foreign key order across batch boundaries, and look like the app's own data.
+"""
+
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, select
+
+from app import db, User, Book, StudySession
+from generate_data import generate
+
+NOW = datetime(2024, 3, 1, 18, 30)
+
+def generated(path, seed, runs=1):
+    args = SimpleNamespace(users=30, books=4, sessions=12, active=0.3, days=60, batch_size=7)
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    with engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA foreign_keys = ON')    # a session before its book would fail
+        written = [generate(connection, args, random.Random(seed), NOW) for _ in range(runs)]
+        rows = {model.__tablename__: [tuple(row) for row in connection.execute(
+                    select(model.__table__).order_by(model.__table__.c.id))]
+                for model in (User, Book, StudySession)}
+    engine.dispose()
+    return written, rows
+
+def test_the_same_seed_generates_the_same_rows(tmp_path):
+    assert generated(tmp_path / 'a.db', 42) == generated(tmp_path / 'b.db', 42)
+    assert generated(tmp_path / 'c.db', 42)[1] != generated(tmp_path / 'd.db', 43)[1]
+
+def test_generated_rows_are_consistent(tmp_path):
+    (written, again), rows = generated(tmp_path / 'data.db', 7, runs=2)
+    assert {table: len(table_rows) for table, table_rows in rows.items()} == \
+        {table: written[table] + again[table] for table in written}
+    assert written['user'] == again['user'] == 30
+    assert [row[0] for row in rows['user']] == list(range(1, 61))    # a second run appends
+
+    book_owner = {book[0]: book[-1] for book in rows['book']}
+    columns = StudySession.__table__.columns.keys()
+    sessions = [dict(zip(columns, row)) for row in rows['study_session']]
+    open_sessions = [s for s in sessions if s['end_time'] is None]
+    assert open_sessions and len(open_sessions) < len(sessions)
+
+    for s in sessions:
+        assert s['start_time'] <= NOW
+        assert s['start_time'] >= NOW - timedelta(days=61)
+        if s['end_time'] is not None:
+            assert s['end_time'] - s['start_time'] == timedelta(minutes=s['duration_minutes'])
+            assert 1 <= s['duration_minutes'] <= 180
+        else:
+            assert s['duration_minutes'] is None
+        if s['book_id'] is not None:
+            assert s['subject'] == 'reading'
+            assert book_owner[s['book_id']] == s['user_id']
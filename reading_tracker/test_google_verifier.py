@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test Google ID token verification against a local stand-in for Google's cert endpoint
+"""
+
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from google_verifier import GoogleTokenVerifier, cache_max_age
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+
+def make_key(kid):
+    """An RSA signer plus the matching self-signed PEM certificate"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name)\
+        .public_key(key.public_key()).serial_number(x509.random_serial_number())\
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))\
+        .sign(key, hashes.SHA256())
+    pem_key = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    return crypt.RSASigner.from_string(pem_key, key_id=kid), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+def make_token(signer, **claims):
+    now = int(time.time())
+    payload = {'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': '1234567890',
+               'email': 'kid@example.com', 'name': 'Test Kid', 'iat': now, 'exp': now + 3600}
+    payload.update(claims)
+    return jwt.encode(signer, payload).decode()
+
+@pytest.fixture(scope='module')
+def keys():
+    return {kid: make_key(kid) for kid in ('key-1', 'key-2')}
+
+@pytest.fixture
+def cert_server(keys):
+    """Serves the certs in state['kids'] with state['max_age'], counting requests"""
+    state = {'kids': ['key-1'], 'max_age': 3600, 'requests': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state['requests'] += 1
+            body = json.dumps({kid: keys[kid][1] for kid in state['kids']}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Cache-Control', f"public, max-age={state['max_age']}, must-revalidate")
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state['url'] = f'http://127.0.0.1:{server.server_port}/oauth2/v1/certs'
+    yield state
+    server.shutdown()
+    server.server_close()
+
+def test_verifies_token_and_reuses_cached_certs(keys, cert_server):
+    verifier = GoogleTokenVerifier(CLIENT_ID, certs_url=cert_server['url'])
+    token = make_token(keys['key-1'][0])
+
+    for _ in range(5):
+        idinfo = verifier.verify(token)
+
+    assert idinfo['email'] == 'kid@example.com'
+    assert cert_server['requests'] == 1
+    assert 3590 <= verifier.stats()['expires_in'] <= 3600
+
+def test_rejects_wrong_audience_issuer_and_signature(keys, cert_server):
+    verifier = GoogleTokenVerifier(CLIENT_ID, certs_url=cert_server['url'])
+
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys['key-1'][0], aud='someone-else'))
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(keys['key-1'][0], iss='https://evil.example.com'))
+
+    # Signed with key-2 but claiming to be key-1
+    forged = make_token(crypt.RSASigner(keys['key-2'][0]._key, key_id='key-1'))
+    with pytest.raises(ValueError):
+        verifier.verify(forged)
+    with pytest.raises(ValueError):
+        verifier.verify('not-a-token')
+
+def test_unknown_key_id_refreshes_once(keys, cert_server):
+    verifier = GoogleTokenVerifier(CLIENT_ID, certs_url=cert_server['url'], min_refresh_interval=0)
+    verifier.verify(make_token(keys['key-1'][0]))
+
+    # Google rotates in key-2 before our cached set expires
+    cert_server['kids'] = ['key-1', 'key-2']
+    assert verifier.verify(make_token(keys['key-2'][0]))['sub'] == '1234567890'
+    assert cert_server['requests'] == 2
+
+    # Further unknown key ids inside min_refresh_interval don't hit the endpoint again
+    verifier.min_refresh_interval = 60
+    with pytest.raises(ValueError):
+        verifier.verify(make_token(crypt.RSASigner(keys['key-2'][0]._key, key_id='key-3')))
+    assert cert_server['requests'] == 2
+
+def test_refreshes_in_background_before_expiry(keys, cert_server):
+    cert_server['max_age'] = 100
+    verifier = GoogleTokenVerifier(CLIENT_ID, certs_url=cert_server['url'], refresh_margin=300)
+    token = make_token(keys['key-1'][0])
+
+    # Already inside the refresh margin: the token is verified with the current
+    # certs straight away and a background thread fetches the next set
+    verifier.verify(token)
+    verifier.verify(token)
+    deadline = time.monotonic() + 5
+    while cert_server['requests'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert cert_server['requests'] == 2
+    assert verifier.verify(token)['aud'] == CLIENT_ID
+
+def test_cache_max_age_honours_age_header():
+    assert cache_max_age({'Cache-Control': 'public, max-age=21000'}, 60) == 21000
+    assert cache_max_age({'Cache-Control': 'public, max-age=21000', 'Age': '1000'}, 60) == 20000
+    assert cache_max_age({}, 60) == 60
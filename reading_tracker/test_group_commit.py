@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test the group commit writer: a burst of writes commits once, and a failing
+write or rollback only fails the callers it belongs to.
+"""
+
+import pytest
+from sqlalchemy import event
+
+from group_commit import GroupCommitWriter
+
+@pytest.fixture
+def make_writer(make_sqlite_app):
+    """A writer over a fresh Note table, plus a list that grows by one per commit"""
+    def make(size):
+        app, db, Note = make_sqlite_app()
+        with app.app_context():
+            db.create_all()
+            commits = []
+            event.listen(db.engine, 'commit', lambda connection: commits.append(1))
+        # A long delay, so every write submitted below lands in the same batch
+        writer = GroupCommitWriter(app, db, max_delay=0.5, max_batch=size)
+        return app, db, Note, writer, commits
+    return make
+
+def add(db, Note, text):
+    def write():
+        note = Note(text=text)
+        db.session.add(note)
+        db.session.flush()
+        return note.text
+    return write
+
+def fail(message):
+    def write():
+        raise ValueError(message)
+    return write
+
+def count(app, db, Note):
+    with app.app_context():
+        return db.session.query(Note).count()
+
+def test_a_burst_of_writes_commits_once(make_writer):
+    app, db, Note, writer, commits = make_writer(8)
+
+    futures = [writer.submit(add(db, Note, f'note {i}')) for i in range(8)]
+
+    assert [future.result(5) for future in futures] == [f'note {i}' for i in range(8)]
+    assert len(commits) == 1
+    assert writer.stats()['batches'] == 1 and writer.stats()['writes'] == 8
+    assert count(app, db, Note) == 8
+
+def test_a_failing_write_fails_only_its_own_caller(make_writer):
+    app, db, Note, writer, commits = make_writer(5)
+
+    writes = [add(db, Note, 'a'), add(db, Note, 'b'), fail('bad write 2'), add(db, Note, None), add(db, Note, 'e')]
+    futures = [writer.submit(write) for write in writes]
+
+    assert futures[0].result(5) == 'a' and futures[1].result(5) == 'b' and futures[4].result(5) == 'e'
+    with pytest.raises(ValueError, match='bad write 2'):
+        futures[2].result(5)
+    with pytest.raises(Exception, match='NOT NULL'):
+        futures[3].result(5)
+    assert writer.stats()['retried_batches'] == 1
+    assert count(app, db, Note) == 3
+
+def test_a_failing_rollback_still_resolves_every_caller(make_writer, monkeypatch):
+    app, db, Note, writer, commits = make_writer(2)
+    def broken_rollback():
+        raise RuntimeError('connection lost')
+    monkeypatch.setattr(db.session, 'rollback', broken_rollback, raising=False)
+
+    futures = [writer.submit(add(db, Note, 'a')), writer.submit(fail('bad write'))]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match='connection lost'):
+            future.result(5)
+    monkeypatch.undo()
+    assert count(app, db, Note) == 0
+    # The writer thread survives and keeps serving
+    assert writer.run(add(db, Note, 'after'), timeout=5) == 'after'
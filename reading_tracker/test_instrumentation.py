@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test request timing on a minimal Flask app with an in-memory SQLite engine, and
+that the timing log line reaches stdout from the app as gunicorn loads it
+"""
+
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+from flask import Flask, jsonify, render_template_string
+from sqlalchemy import create_engine, text
+
+from instrumentation import RequestTimer
+
+def make_app(sample_rate):
+    app = Flask(__name__)
+    app.config['REQUEST_TIMING_SAMPLE_RATE'] = sample_rate
+    engine = create_engine('sqlite://')
+    timer = RequestTimer(app)
+
+    @app.route('/page')
+    def page():
+        with engine.connect() as conn:
+            rows = [conn.execute(text('SELECT :n'), {'n': n}).scalar() for n in range(3)]
+        return render_template_string('{% for row in rows %}{{ row }}{% endfor %}', rows=rows)
+
+    @app.route('/api')
+    def api():
+        return jsonify({'ok': True})
+
+    return app, timer
+
+def server_timing(response):
+    """{metric: (duration_ms, description)} from a Server-Timing header"""
+    metrics = {}
+    for entry in response.headers['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        values = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(values['dur']), values.get('desc', '').strip('"'))
+    return metrics
+
+def test_times_queries_rendering_and_the_whole_request(caplog):
+    app, timer = make_app(1.0)
+    with caplog.at_level(logging.INFO, logger='instrumentation'):
+        response = app.test_client().get('/page')
+
+    assert response.data == b'012'
+    metrics = server_timing(response)
+    assert metrics['db'][1] == '3 queries'
+    assert metrics['app'][0] >= metrics['db'][0] + metrics['render'][0]
+
+    record = caplog.records[-1]
+    assert record.json_fields['endpoint'] == 'page'
+    assert record.json_fields['db_queries'] == 3
+    assert record.http_request == {'requestMethod': 'GET', 'requestUrl': '/page', 'status': 200}
+    assert re.match(r'GET /page 200 in [\d.]+ms \(3 queries', record.getMessage())
+
+def test_requests_outside_the_sample_are_not_timed(caplog):
+    app, timer = make_app(1.0)
+    timer.sample_rate = 0.0
+    with caplog.at_level(logging.INFO, logger='instrumentation'):
+        response = app.test_client().get('/page')
+
+    assert 'Server-Timing' not in response.headers
+    assert not caplog.records
+
+@pytest.mark.parametrize('sample_rate', [0, None])
+def test_off_when_sample_rate_is_zero(sample_rate):
+    app, timer = make_app(sample_rate)
+    assert 'Server-Timing' not in app.test_client().get('/api').headers
+
+def test_the_deployed_app_writes_the_timing_line_to_stdout(tmp_path):
+    # A fresh interpreter importing app:app with the production config, as gunicorn does;
+    # nothing in it configures logging except the app itself
+    env = dict(os.environ, FLASK_ENV='production', REQUEST_TIMING_SAMPLE_RATE='1',
+               DATABASE_URL=f'sqlite:///{tmp_path / "deployed.db"}')
+    for name in ('LOG_LEVEL', 'LOG_FORMAT', 'WEBSITE_SITE_NAME'):
+        env.pop(name, None)
+    script = "from app import app\nprint(app.test_client().get('/').status_code)"
+    result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    lines = [json.loads(line) for line in result.stdout.splitlines() if line.startswith('{')]
+    timing = [line for line in lines if line.get('endpoint') == 'index']
+    assert timing and timing[0]['severity'] == 'INFO'
+    assert timing[0]['httpRequest']['requestUrl'] == '/'
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test keyset pagination of the library and study history: walking every page
+returns each row exactly once, in order, across timestamp ties and books
+without a date_read.
+"""
+
+from datetime import datetime, timedelta
+
+from app import (app, db, Book, StudySession, keyset_cursor, load_library_page,
+                 load_session_page, parse_keyset_cursor)
+
+def add_books(user_id, dates):
+    """Books with the given date_read values; None means NULL (the column default would fill it in)"""
+    books = [Book(title=f'Book {i}', user_id=user_id, date_read=date or datetime(2000, 1, 1))
+             for i, date in enumerate(dates)]
+    db.session.add_all(books)
+    db.session.flush()
+    undated = [book.id for book, date in zip(books, dates) if date is None]
+    Book.query.filter(Book.id.in_(undated)).update({Book.date_read: None}, synchronize_session=False)
+    db.session.commit()
+    return undated
+
+def walk(load, user_id, limit):
+    """Every row reachable by following next cursors, plus the number of pages"""
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, next_cursor = load(user_id, parse_keyset_cursor(cursor, nullable=True) if cursor else None, limit)
+        rows.extend(page)
+        pages += 1
+        if next_cursor is None:
+            return rows, pages
+        cursor = next_cursor
+
+def test_library_pages_cover_ties_and_undated_books_once(user):
+    day = datetime(2024, 5, 1, 12, 0)
+    dates = [day, day, day, day - timedelta(days=1), None, None, None, day + timedelta(days=1)]
+    with app.app_context():
+        undated = add_books(user, dates)
+        expected = sorted(Book.query.filter_by(user_id=user).all(),
+                          key=lambda book: (book.date_read is None, -(book.date_read or day).timestamp(), -book.id))
+        expected = [book.id for book in expected]
+
+        for limit in (1, 2, 3, 10):
+            rows, pages = walk(load_library_page, user, limit)
+            assert [row.id for row in rows] == expected, limit
+            assert pages == max(-(-len(expected) // limit), 1)
+
+    assert expected[-3:] == sorted(undated, reverse=True)    # undated books last, newest id first
+
+def test_library_route_follows_a_cursor_taken_at_an_undated_book(user, client_for):
+    with app.app_context():
+        ids = sorted(add_books(user, [None, None, None]), reverse=True)
+
+    client = client_for(user)
+    response = client.get('/books?before=' + keyset_cursor(None, ids[0]))
+    assert response.status_code == 200
+    assert response.data.count(b'Still reading') == 2
+    assert client.get('/dashboard').status_code == 200
+
+def test_cursors_round_trip():
+    moment = datetime(2024, 5, 1, 12, 30, 15, 250)
+    assert parse_keyset_cursor(keyset_cursor(moment, 7)) == (moment, 7)
+    assert parse_keyset_cursor(keyset_cursor(None, 7), nullable=True) == (None, 7)
+    assert parse_keyset_cursor(keyset_cursor(None, 7)) is None       # study history has no undated rows
+    assert parse_keyset_cursor('garbage') is None
+
+def test_study_history_pages_cover_tied_start_times_once(user):
+    start = datetime(2024, 5, 1, 9, 0)
+    starts = [start] * 4 + [start - timedelta(hours=1)] * 2 + [start + timedelta(hours=1)]
+    with app.app_context():
+        db.session.add_all(StudySession(subject='maths', user_id=user, start_time=at,
+                                        end_time=at + timedelta(minutes=20), duration_minutes=20) for at in starts)
+        db.session.add(StudySession(subject='maths', user_id=user, start_time=start))   # still open: not listed
+        db.session.commit()
+        expected = [session.id for session in StudySession.query.filter(
+            StudySession.user_id == user, StudySession.end_time.isnot(None)
+        ).order_by(StudySession.start_time.desc(), StudySession.id.desc())]
+
+        for limit in (1, 2, 4):
+            rows, _ = walk(load_session_page, user, limit)
+            assert [row.id for row in rows] == expected, limit
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test the /metrics exposition, in one process and summed across worker processes
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+
+import pytest
+
+pytest.importorskip('prometheus_client')
+from flask import Flask
+from prometheus_client.parser import text_string_to_metric_families
+
+from cache import UserCache
+from metrics import Metrics, mark_process_dead
+
+# A stand-in for app.py: one worker process with a pooled SQLite engine and a cache
+WORKER = textwrap.dedent('''
+    import sys
+    from flask import Flask, Response
+    from sqlalchemy import create_engine, text
+    from cache import LRUCache
+    from metrics import Metrics
+
+    app = Flask(__name__)
+    engine = create_engine('sqlite:///' + sys.argv[1], pool_size=3, max_overflow=2)
+    cache = LRUCache(8)
+    metrics = Metrics(app, engines={'primary': lambda: engine}, caches={'pages': cache},
+                      active_sessions=lambda: 2)
+    held = []
+
+    @app.route('/page')
+    def page():
+        cache.get('key') or cache.set('key', 'value')
+        held.append(engine.connect())    # keep a connection checked out, as a slow request would
+        return str(held[-1].execute(text('SELECT 1')).scalar())
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        body, content_type = metrics.exposition()
+        return Response(body, content_type=content_type)
+
+    client = app.test_client()
+    for _ in range(int(sys.argv[2])):
+        assert client.get('/page').status_code == 200
+    if sys.argv[3] == 'scrape':
+        sys.stdout.write(client.get('/metrics').get_data(as_text=True))
+''')
+
+def run_worker(tmp_path, requests, scrape, multiproc_dir=None, pids=None):
+    env = dict(os.environ)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    if multiproc_dir:
+        env['PROMETHEUS_MULTIPROC_DIR'] = str(multiproc_dir)
+    worker = subprocess.Popen([sys.executable, '-c', WORKER, str(tmp_path / 'metrics.db'), str(requests),
+                               'scrape' if scrape else 'quiet'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    stdout, stderr = worker.communicate()
+    assert worker.returncode == 0, stderr
+    if pids is not None:
+        pids.append(worker.pid)
+    return stdout
+
+def samples(exposition):
+    """{(sample name, frozenset of labels): value}"""
+    return {(sample.name, frozenset(sample.labels.items())): sample.value
+            for family in text_string_to_metric_families(exposition) for sample in family.samples}
+
+def page_label(**labels):
+    return frozenset(dict({'endpoint': 'page', 'method': 'GET', 'status': '200'}, **labels).items())
+
+def test_single_process_exposition(tmp_path):
+    values = samples(run_worker(tmp_path, 4, scrape=True))
+
+    assert values[('http_request_duration_seconds_count', page_label())] == 4
+    assert values[('http_requests_in_progress', frozenset())] == 1    # the scrape itself
+    assert values[('db_pool_checked_out', frozenset({('engine', 'primary')}))] == 4
+    assert values[('db_pool_overflow', frozenset({('engine', 'primary')}))] == 1
+    assert values[('cache_lookups_total', frozenset({('cache', 'pages'), ('result', 'miss')}))] == 1
+    assert values[('cache_hit_ratio', frozenset({('cache', 'pages')}))] == 0.75
+    assert values[('study_sessions_active', frozenset())] == 2
+
+def test_multiprocess_totals_cover_every_worker(tmp_path):
+    shared = tmp_path / 'prometheus'
+    shared.mkdir()
+    run_worker(tmp_path, 3, scrape=False, multiproc_dir=shared)
+    values = samples(run_worker(tmp_path, 2, scrape=True, multiproc_dir=shared))
+
+    # Counters and histograms add up across workers
+    assert values[('http_request_duration_seconds_count', page_label())] == 5
+    assert values[('cache_lookups_total', frozenset({('cache', 'pages'), ('result', 'hit')}))] == 3
+    assert values[('cache_hit_ratio', frozenset({('cache', 'pages')}))] == 0.6
+    # Live gauges count only processes that haven't been marked dead; neither has here
+    assert values[('db_pool_checked_out', frozenset({('engine', 'primary')}))] == 5
+
+def test_the_preloading_masters_pool_gauges_are_dropped_after_fork(tmp_path, monkeypatch):
+    shared = tmp_path / 'prometheus'
+    shared.mkdir()
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(shared))
+    master = []
+    run_worker(tmp_path, 0, scrape=False, multiproc_dir=shared, pids=master)    # imports the app, serves nothing
+    mark_process_dead(master[0])    # what gunicorn.conf.py's post_fork does
+    values = samples(run_worker(tmp_path, 2, scrape=True, multiproc_dir=shared))
+
+    assert values[('db_pool_size', frozenset({('engine', 'primary')}))] == 3    # this worker's pool only
+    assert values[('db_pool_checked_out', frozenset({('engine', 'primary')}))] == 2
+
+def test_concurrent_lookups_are_all_counted_once(monkeypatch):
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    monkeypatch.delenv('prometheus_multiproc_dir', raising=False)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)    # switch threads often, so unlocked updates would collide
+    cache = UserCache(['page'])
+    metrics = Metrics(Flask(__name__), caches={'pages': cache})
+
+    def request_thread(user_id):
+        for _ in range(2000):
+            cache.get_or_load(user_id, 'page', lambda: 'value')
+            metrics._count_cache_lookups()
+    try:
+        threads = [threading.Thread(target=request_thread, args=(n % 2,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 16000
+    counted = lambda result: metrics.registry.get_sample_value('cache_lookups_total',
+                                                               {'cache': 'pages', 'result': result})
+    assert (counted('hit'), counted('miss')) == (stats['hits'], stats['misses'])
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression tests
+Runs each route against a seeded SQLite database, replays every statement it
+sent under EXPLAIN QUERY PLAN and fails when one scans a whole table instead
+of using an index. Routes also may not lazy-load relationships (N+1 queries).
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from sqlalchemy import event
+
+from app import (app, db, db_router, user_cache, identity_cache, User, Book, StudySession,
+                 UserStudyTotals, SUBJECTS, record_completed_session)
+from instrumentation import LazyLoadLimitExceeded
+
+SEED_USERS = 40
+
+# Full scans that are the point of the query rather than a missing index
+ALLOWED_SCANS = {
+    'admin_dashboard': {'user'},   # lists every user
+}
+
+# Indexes the leaderboard deliberately walks in order: pages stop after LIMIT
+# rows and the user count reads only the index
+INDEX_WALKS = {'idx_totals_minutes'}
+
+GET_ROUTES = [
+    ('dashboard', '/dashboard'),
+    ('books', '/books'),
+    ('books', '/books?q=wizard'),
+    ('api_book_search', '/api/books/search?q=dragon'),
+    ('study_sessions', '/study'),
+    ('current_study', '/study/current'),
+    ('leaderboard', '/leaderboard'),
+    ('leaderboard', '/leaderboard?page=2'),
+    ('leaderboard', '/leaderboard?window=today'),
+    ('leaderboard', '/leaderboard?window=month&subject=maths'),
+    ('api_leaderboard', '/api/leaderboard?window=week'),
+    ('api_subject_breakdown', '/api/subjects'),
+    ('admin_dashboard', '/admin'),
+]
+
+POST_ROUTES = [
+    ('add_book', '/books/add', {'title': 'The Hobbit', 'author': 'Tolkien', 'summary': 'A dragon and a burglar'}),
+    ('start_study', '/study/start', {'subject': 'science'}),
+    ('stop_study', '/study/stop', {'notes': 'Planets'}),
+]
+
+@pytest.fixture(scope='module')
+def client():
+    rng = random.Random(16)
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        db.create_all()
+        for i in range(SEED_USERS):
+            user = User(email=f'kid{i}@example.com', name=f'Kid {i}', google_id=f'plan-{i}',
+                        is_approved=True, is_admin=(i == 0))
+            user.study_totals = UserStudyTotals()
+            db.session.add(user)
+            db.session.flush()
+            books = [Book(title=f'Book {b} of kid {i}', author='Author', user_id=user.id,
+                          summary='A wizard, a dragon and a long journey home',
+                          date_read=now - timedelta(days=rng.randint(0, 400))) for b in range(15)]
+            db.session.add_all(books)
+            db.session.flush()
+            for s in range(40):
+                start = now - timedelta(days=rng.randint(0, 60), minutes=rng.randint(0, 600))
+                subject = rng.choice(SUBJECTS)
+                session = StudySession(subject=subject, start_time=start, user_id=user.id,
+                                       end_time=start + timedelta(minutes=30), duration_minutes=30,
+                                       book_id=rng.choice(books).id if subject == 'reading' else None)
+                db.session.add(session)
+                record_completed_session(session)
+        db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        admin_id = User.query.filter_by(is_admin=True).first().id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    return client
+
+@pytest.fixture
+def captured():
+    """Every SELECT/UPDATE/DELETE sent to either engine while the test runs"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engines = [db.engine] + ([db_router.reader] if db_router.reader is not None else [])
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', capture)
+    # Cold caches, so the route runs all of its queries
+    user_cache.local.clear()
+    identity_cache.local.clear()
+    yield statements
+    for engine in engines:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+def full_scans(statements, allowed=()):
+    """(plan step, statement) for every step that scans a whole table rather than searching an index
+
+    SQLite reports index lookups as SEARCH; a SCAN reads every row, either from
+    the table or from end to end of an index.
+    """
+    tables = set(db.metadata.tables)
+    scans = []
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for statement, parameters in statements:
+                for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all():
+                    detail = row[-1]
+                    if not detail.startswith('SCAN '):
+                        continue
+                    table = detail.split()[1]
+                    if table not in tables or table in allowed or detail.split()[-1] in INDEX_WALKS:
+                        continue
+                    scans.append((detail, ' '.join(statement.split())[:160]))
+    return scans
+
+@pytest.mark.parametrize('endpoint,path', GET_ROUTES)
+def test_get_routes_use_indexes(client, captured, endpoint, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.headers['X-Lazy-Loads'] == '0'
+    assert captured, f'{path} sent no queries to check'
+    assert full_scans(captured, ALLOWED_SCANS.get(endpoint, ())) == []
+
+@pytest.mark.parametrize('endpoint,path,data', POST_ROUTES)
+def test_write_routes_use_indexes(client, captured, endpoint, path, data):
+    response = client.post(path, data=data)
+    assert response.status_code in (200, 302)
+    assert response.headers['X-Lazy-Loads'] == '0'
+    assert full_scans(captured, ALLOWED_SCANS.get(endpoint, ())) == []
+
+def test_lazy_load_guard_catches_n_plus_one(client):
+    with app.test_request_context('/study'):
+        sessions = StudySession.query.filter(StudySession.book_id.isnot(None)).limit(3).all()
+        db.session.expunge_all()
+        for session in sessions:
+            db.session.add(session)
+        with pytest.raises(LazyLoadLimitExceeded):
+            [session.book.title for session in sessions]
+        db.session.rollback()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Test role resolution from configured address lists
+"""
+
+from roles import RoleResolver, parse_emails
+
+def test_addresses_are_parsed_once_and_case_folded():
+    assert parse_emails(' Admin@Example.com, ,teacher@example.com ') == {'admin@example.com', 'teacher@example.com'}
+    assert parse_emails(['A@example.com', '']) == {'a@example.com'}
+    assert parse_emails(None) == frozenset()
+
+    resolver = RoleResolver({'admin': 'Head@School.org', 'teacher': ['head@school.org', 'ms.lee@school.org']})
+    assert resolver.roles('  HEAD@school.ORG') == {'admin', 'teacher'}
+    assert resolver.is_admin('head@school.org')
+    assert not resolver.is_admin('ms.lee@school.org')
+    assert resolver.has_role('ms.lee@school.org', 'teacher')
+    assert resolver.roles(None) == frozenset()
+
+def test_lookups_are_cached_until_the_table_changes():
+    resolver = RoleResolver({'admin': 'a@example.com'})
+    for _ in range(3):
+        assert resolver.is_admin('a@example.com')
+    assert resolver.stats()['cache']['hits'] == 2
+
+    resolver.update({'admin': 'b@example.com'})
+    assert not resolver.is_admin('a@example.com')
+    assert resolver.is_admin('B@example.com')
+    assert resolver.stats()['addresses'] == {'admin': 1}
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test cached secret resolution and rotation of mounted secret files
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'Pipeline', 'config'))
+from gcp_config import SecretProvider
+
+def write_secret(directory, name, value, bump=0):
+    path = directory / name
+    path.write_text(value + '\n')
+    if bump:
+        # Make sure the change is visible even on filesystems with coarse mtimes
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 1_000_000_000))
+
+def test_reads_each_file_once(tmp_path):
+    write_secret(tmp_path, 'admin-emails', 'a@example.com, b@example.com')
+    provider = SecretProvider(tmp_path, poll_interval=0)
+
+    for _ in range(5):
+        assert provider.get('admin-emails') == 'a@example.com, b@example.com'
+    assert provider.file_reads == 1
+    assert provider.check() == {}
+    assert provider.file_reads == 1
+
+def test_rotated_file_is_swapped_in_and_announced(tmp_path):
+    write_secret(tmp_path, 'admin-emails', 'a@example.com')
+    provider = SecretProvider(tmp_path, poll_interval=0)
+    announced = []
+    provider.on_change(announced.append)
+    provider.get('admin-emails')
+
+    write_secret(tmp_path, 'admin-emails', 'a@example.com,c@example.com', bump=1)
+
+    assert provider.check() == {'admin-emails': 'a@example.com,c@example.com'}
+    assert provider.get('admin-emails') == 'a@example.com,c@example.com'
+    assert announced == [{'admin-emails': 'a@example.com,c@example.com'}]
+    assert provider.rotations == 1
+
+def test_environment_fallback_until_a_file_is_mounted(tmp_path, monkeypatch):
+    monkeypatch.setenv('GOOGLE_CLIENT_ID', 'from-env')
+    provider = SecretProvider(tmp_path, poll_interval=0)
+    assert provider.get('google-client-id') == 'from-env'
+    assert provider.get('metrics-token', 'fallback') == 'fallback'
+
+    write_secret(tmp_path, 'google-client-id', 'from-file')
+    assert provider.check() == {'google-client-id': 'from-file'}
+
+def test_poller_picks_up_rotation(tmp_path):
+    write_secret(tmp_path, 'secret-key', 'old')
+    provider = SecretProvider(tmp_path, poll_interval=0.02)
+    assert provider.get('secret-key') == 'old'
+    provider.start()
+
+    write_secret(tmp_path, 'secret-key', 'new', bump=1)
+    deadline = time.monotonic() + 5
+    while provider.get('secret-key') != 'new' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert provider.get('secret-key') == 'new'
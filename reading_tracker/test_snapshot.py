@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test the shared leaderboard snapshot file, the leaderboard views served from it,
+and worker-safe engine disposal after fork
+"""
+
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db_routing import dispose_inherited_pools
+from snapshot import LeaderboardSnapshot, write_snapshot
+
+Entry = namedtuple('Entry', ['id', 'name', 'total_minutes', 'rank'])
+
+ROWS = [(7, 'Maya', 300), (3, 'Leo', 250), (9, 'Zoë', 250), (1, 'Kai', 100)]
+
+def test_pages_are_read_from_the_mapped_file_with_shared_ranks(tmp_path):
+    path = str(tmp_path / 'leaderboard.bin')
+    assert write_snapshot(path, ROWS) == 4
+
+    board = LeaderboardSnapshot(path, entry=Entry._make).current()
+
+    assert len(board) == 4
+    assert board.page(1, 2) == [Entry(7, 'Maya', 300, 1), Entry(3, 'Leo', 250, 2)]
+    assert board.page(2, 2) == [Entry(9, 'Zoë', 250, 2), Entry(1, 'Kai', 100, 4)]
+    assert board.page(3, 2) == []
+
+    assert board.find(9) == Entry(9, 'Zoë', 250, 2)
+    assert board.find(1) == Entry(1, 'Kai', 100, 4)
+    assert board.find(5) is None and board.find(0) is None and board.find(10) is None
+
+def test_stale_snapshot_is_rebuilt_and_remapped(tmp_path):
+    path = str(tmp_path / 'leaderboard.bin')
+    snapshot = LeaderboardSnapshot(path, max_age=60)
+    builds = []
+    def build():
+        builds.append(1)
+        return ROWS[:len(builds) + 1]
+
+    assert snapshot.get(build) is None       # nothing to serve until the first build lands
+    snapshot.wait()
+    assert len(snapshot.get(build)) == 2
+    assert len(snapshot.get(build)) == 2     # fresh: no rebuild
+    snapshot.wait()
+    assert len(builds) == 1
+
+    old = snapshot.current()
+    write_snapshot(path, ROWS, built_at=0)   # another worker wrote an already stale one
+    assert len(snapshot.get(build)) == 4     # served while it is rebuilt
+    snapshot.wait()
+    assert len(snapshot.get(build)) == 3
+    assert snapshot.stats()['rebuilds'] == 2
+    assert len(old) == 2 and old.page(1, 1)[0][1] == 'Maya'   # still readable after the swap
+
+def test_requests_serve_the_previous_snapshot_while_it_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'leaderboard.bin')
+    write_snapshot(path, ROWS[:1], built_at=0)
+    snapshot = LeaderboardSnapshot(path, max_age=60)
+    started, release = threading.Event(), threading.Event()
+    def slow_rows():
+        started.set()
+        release.wait(5)
+        yield from ROWS
+
+    assert len(snapshot.get(slow_rows)) == 1
+    assert started.wait(5)
+    assert len(snapshot.get(slow_rows)) == 1    # neither blocked nor a second rebuild
+    release.set()
+    snapshot.wait()
+    assert len(snapshot.get(slow_rows)) == 4 and snapshot.stats()['rebuilds'] == 1
+
+def test_a_failed_rebuild_keeps_the_previous_snapshot(tmp_path):
+    path = str(tmp_path / 'leaderboard.bin')
+    write_snapshot(path, ROWS, built_at=0)
+    snapshot = LeaderboardSnapshot(path, max_age=60)
+    def broken_rows():
+        yield ROWS[0]
+        raise RuntimeError('database went away')
+
+    snapshot.get(broken_rows)
+    snapshot.wait()
+    assert len(snapshot.current()) == 4
+    assert [name for name in os.listdir(tmp_path) if name.startswith('.snapshot-')] == []
+
+def test_the_callers_row_comes_from_the_same_snapshot_as_the_page(user, client_for, tmp_path, monkeypatch):
+    import app as app_module
+    from app import app, db, StudySession, LeaderboardEntry, all_time_rows, close_study_session
+
+    snapshot = LeaderboardSnapshot(str(tmp_path / 'leaderboard.bin'), max_age=60, entry=LeaderboardEntry._make)
+    monkeypatch.setattr(app_module, 'leaderboard_snapshot', snapshot)
+    snapshot.get(all_time_rows)
+    snapshot.wait()
+    client = client_for(user)
+
+    before = client.get('/api/leaderboard?per_page=100').get_json()
+    assert before['updated_at'] is not None
+    assert before['current_user'] in before['entries'] or before['current_user']['rank'] > 100
+
+    # A new session only shows up with the next snapshot, for the caller's row too
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with app.app_context():
+        study_session = StudySession(subject='maths', user_id=user, start_time=now - timedelta(minutes=30))
+        db.session.add(study_session)
+        db.session.flush()
+        close_study_session(study_session, now)
+        db.session.commit()
+
+    after = client.get('/api/leaderboard?per_page=100').get_json()
+    assert after['current_user'] == before['current_user'] and after['entries'] == before['entries']
+    assert b'Rankings as of' in client.get('/leaderboard').data
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker_opens_its_own_connections(make_sqlite_app):
+    app, db, Note = make_sqlite_app('fork.db')
+    with app.app_context():
+        db.create_all()
+        db.session.remove()
+        inherited = db.engine.pool.checkedin()
+    assert inherited == 1
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            dispose_inherited_pools(app)
+            with app.app_context():
+                fresh = db.engine.pool.checkedin() == 0
+                db.session.add(Note(text='from the child'))
+                db.session.commit()
+            os._exit(0 if fresh else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    # The parent's pooled connection was left open and still works
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 1
+        assert db.session.execute(db.text('SELECT count(*) FROM note')).scalar() == 1
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Test the study event stream: a start/stop made through this worker reaches the
+tab as a 'session' event without a redundant resync, while one made by another
+worker triggers a resync on the next heartbeat.
+"""
+
+import app as app_module
+from app import study_events
+from cache import SQLiteCacheBackend, UserCache
+
+def event_name(chunk):
+    return chunk.split('\n', 1)[0].removeprefix('event: ')
+
+def test_only_other_workers_changes_trigger_a_resync(user, client_for, tmp_path, monkeypatch):
+    backend_path = str(tmp_path / 'shared.db')
+    monkeypatch.setattr(app_module, 'user_cache', UserCache(app_module.USER_CACHE_NAMES,
+                                                            backend=SQLiteCacheBackend(backend_path)))
+    monkeypatch.setattr(study_events, 'heartbeat', 0.05)
+    other_worker = UserCache(app_module.USER_CACHE_NAMES, backend=SQLiteCacheBackend(backend_path))
+
+    client = client_for(user)
+    response = client.get('/study/events', buffered=False)
+    chunks = (chunk.decode() for chunk in response.response)
+    try:
+        assert next(chunks).startswith('retry:')
+        assert event_name(next(chunks)) == 'session'
+
+        assert client.post('/study/start', data={'subject': 'maths'}).status_code == 200
+        assert event_name(next(chunks)) == 'session'
+        assert [event_name(next(chunks)) for _ in range(3)] == ['elapsed'] * 3
+
+        other_worker.put(user, 'active', None)     # a stop handled by another worker
+        assert event_name(next(chunks)) == 'resync'
+        assert event_name(next(chunks)) == 'elapsed'
+
+        assert client.post('/study/stop').status_code == 200
+        assert event_name(next(chunks)) == 'session'
+        assert next(chunks) == ': ping\n\n'
+    finally:
+        response.close()
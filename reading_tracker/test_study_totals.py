@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test the maintained study aggregates: totals, subject totals and day rollups
+must always equal what study_session says, including when stops race, and
+leaderboard ranks must share places on ties.
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, false, func
+
+from app import (app, db, StudySession, UserStudyTotals, UserSubjectTotals, StudyRollup,
+                 close_study_session, leaderboard_entry, leaderboard_page, leaderboard_source,
+                 rebuild_study_totals)
+
+def start(client, subject, minutes_ago):
+    start_time = (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+    assert client.post('/study/start', data={'subject': subject, 'start_time': start_time}).status_code == 200
+
+def aggregates(user_id):
+    """(maintained totals, the same numbers recomputed from study_session)"""
+    with app.app_context():
+        totals = db.session.get(UserStudyTotals, user_id)
+        subjects = dict(db.session.query(UserSubjectTotals.subject, UserSubjectTotals.total_minutes)
+                        .filter_by(user_id=user_id))
+        rollup = db.session.query(func.sum(StudyRollup.total_minutes), func.sum(StudyRollup.session_count))\
+            .filter_by(user_id=user_id).one()
+        closed = db.session.query(func.sum(StudySession.duration_minutes), func.count(StudySession.id))\
+            .filter(StudySession.user_id == user_id, StudySession.end_time.isnot(None)).one()
+        closed_subjects = dict(db.session.query(StudySession.subject, func.sum(StudySession.duration_minutes))
+                               .filter(StudySession.user_id == user_id, StudySession.end_time.isnot(None))
+                               .group_by(StudySession.subject))
+        maintained = (totals.total_minutes, totals.session_count, subjects, tuple(rollup))
+        actual = (closed[0] or 0, closed[1], closed_subjects, (closed[0], closed[1]))
+        return maintained, actual
+
+def test_totals_follow_start_stop_and_switching_subjects(make_user, client_for):
+    user_id = make_user('Switcher')
+    client = client_for(user_id)
+
+    start(client, 'maths', 50)
+    start(client, 'reading', 20)      # closes the maths session
+    assert client.post('/study/stop', data={'notes': 'Chapter 3'}).get_json()['success']
+    assert client.post('/study/stop').status_code == 400
+
+    maintained, actual = aggregates(user_id)
+    assert maintained == actual
+    assert maintained[1] == 2 and set(maintained[2]) == {'maths', 'reading'}
+
+def test_concurrent_stops_fold_the_session_once(make_user, client_for):
+    user_id = make_user('Double Stopper')
+    clients = [client_for(user_id) for _ in range(6)]
+    statuses = []
+    for _ in range(5):
+        start(clients[0], 'science', 30)
+        barrier = threading.Barrier(len(clients))
+        def stop(client):
+            barrier.wait()
+            statuses.append(client.post('/study/stop').status_code)
+        threads = [threading.Thread(target=stop, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert statuses.count(200) == 5
+    maintained, actual = aggregates(user_id)
+    assert maintained == actual
+    assert maintained[1] == 5
+
+def test_a_stale_close_is_rejected(make_user, client_for):
+    user_id = make_user('Stale')
+    client = client_for(user_id)
+    start(client, 'writing', 40)
+
+    with app.app_context():
+        stale = StudySession.query.filter_by(user_id=user_id, end_time=None).one()
+        db.session.expunge(stale)
+    assert client.post('/study/stop').status_code == 200
+    with app.app_context():
+        db.session.add(stale)
+        assert close_study_session(stale, datetime.now(timezone.utc)) is False
+        db.session.commit()
+
+    maintained, actual = aggregates(user_id)
+    assert maintained == actual and maintained[1] == 1
+
+def test_first_closes_racing_to_insert_the_same_rows_both_count(make_user):
+    user_id = make_user('Racer')
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with app.app_context():
+        first, second = (StudySession(subject='reading', user_id=user_id, start_time=now - timedelta(minutes=minutes))
+                         for minutes in (30, 45))
+        db.session.add_all([first, second])
+        db.session.commit()
+        close_study_session(first, now)
+        db.session.commit()
+
+        # The second close's updates ran before the first close's inserts committed, so
+        # they matched nothing and it takes the insert path for every aggregate as well
+        missed = set()
+        def miss_once(state):
+            table = state.statement.table.name if state.is_update else None
+            if table in ('user_study_totals', 'user_subject_totals', 'study_rollup') and table not in missed:
+                missed.add(table)
+                return state.invoke_statement(statement=state.statement.where(false()))
+        event.listen(db.session, 'do_orm_execute', miss_once)
+        try:
+            assert close_study_session(second, now) is True
+            db.session.commit()
+        finally:
+            event.remove(db.session, 'do_orm_execute', miss_once)
+        assert missed == {'user_study_totals', 'user_subject_totals', 'study_rollup'}
+
+    maintained, actual = aggregates(user_id)
+    assert maintained == actual
+    assert maintained[:3] == (75, 2, {'reading': 75})
+
+def test_leaderboard_ranks_share_places_on_ties_and_match_a_rebuild(make_user):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    # Larger than anything other tests create, so these four are the top of the board
+    minutes = {'Top': 9000, 'Tie A': 6000, 'Tie B': 6000, 'Last': 5000}
+    ids = {name: make_user(name) for name in minutes}
+    with app.app_context():
+        for name, total in minutes.items():
+            session = StudySession(subject='maths', user_id=ids[name], start_time=now - timedelta(minutes=total))
+            db.session.add(session)
+            db.session.flush()
+            close_study_session(session, now)
+        db.session.commit()
+
+        def snapshot():
+            rows = leaderboard_page(1, leaderboard_source('all'), per_page=4)
+            rollups = db.session.query(StudyRollup.bucket_date, StudyRollup.user_id, StudyRollup.total_minutes)\
+                .filter(StudyRollup.user_id.in_(ids.values())).order_by(StudyRollup.user_id).all()
+            return [(row.name, row.total_minutes, row.rank) for row in rows], rollups
+
+        board, rollups = snapshot()
+        assert board == [('Top', 9000, 1), ('Tie A', 6000, 2), ('Tie B', 6000, 2), ('Last', 5000, 4)]
+        assert leaderboard_entry(ids['Tie B'], leaderboard_source('all')).rank == 2
+        assert leaderboard_entry(ids['Last'], leaderboard_source('all')).rank == 4
+
+        # A tie that straddles a page boundary keeps its shared rank on the next page
+        assert leaderboard_page(2, leaderboard_source('all'), per_page=2)[0].rank == 2
+
+        rebuild_study_totals()
+        assert snapshot() == (board, rollups)
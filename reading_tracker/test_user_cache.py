@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test that cached pages and identities never outlive the writes that change them
+"""
+
+import os
+
+import pytest
+
+from sqlalchemy import func
+
+import app as app_module
+from app import app, db, User, user_cache, identity_cache, load_user, load_user_snapshot
+from cache import SQLiteCacheBackend, UserCache
+
+@pytest.fixture(params=['local', 'sqlite'])
+def make_cache(request, tmp_path):
+    """Builds caches the way one worker (local) or several workers (shared SQLite file) do"""
+    def make():
+        backend = SQLiteCacheBackend(str(tmp_path / 'shared.db')) if request.param == 'sqlite' else None
+        return UserCache(('page',), backend=backend)
+    return make
+
+def test_invalidation_makes_the_next_read_miss(make_cache):
+    cache = make_cache()
+    loads = []
+    def loader():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get_or_load(1, 'page', loader) == 1
+    assert cache.get_or_load(1, 'page', loader) == 1
+    cache.invalidate(1, 'page')
+    assert cache.get_or_load(1, 'page', loader) == 2
+    cache.put(1, 'page', 'written')
+    assert cache.get_or_load(1, 'page', loader) == 'written'
+    assert len(loads) == 2
+
+def test_a_load_racing_an_invalidation_is_not_kept(make_cache):
+    cache = make_cache()
+    def stale_loader():
+        # A write commits and invalidates while this load is still reading the old data
+        cache.invalidate(1, 'page')
+        return 'stale'
+
+    assert cache.get_or_load(1, 'page', stale_loader) == 'stale'
+    assert cache.get_or_load(1, 'page', lambda: 'fresh') == 'fresh'
+
+    # The same race against a put
+    def racing_put():
+        cache.put(1, 'page', 'written')
+        return 'stale'
+    cache.invalidate(1, 'page')
+    cache.get_or_load(1, 'page', racing_put)
+    # The stale value is tagged with the older generation, so it costs a reload but is never served
+    assert cache.get_or_load(1, 'page', lambda: 'reloaded') == 'reloaded'
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    backend_path = str(tmp_path / 'shared.db')
+    first = UserCache(('page',), backend=SQLiteCacheBackend(backend_path))
+    second = UserCache(('page',), backend=SQLiteCacheBackend(backend_path))
+
+    assert first.get_or_load(1, 'page', lambda: 'old') == 'old'
+    second.invalidate(1, 'page')
+    assert first.get_or_load(1, 'page', lambda: 'new') == 'new'
+    assert second.get_or_load(1, 'page', lambda: 'unused') == 'new'    # shared entry
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_each_process_opens_its_own_backend_connection(tmp_path):
+    backend_path = str(tmp_path / 'shared.db')
+    backend = SQLiteCacheBackend(backend_path)
+    assert not os.path.exists(backend_path)     # a preloading master connects to nothing
+    backend.bump('1:page')
+    parent_connection = backend._connection()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            fresh = backend._connection() is not parent_connection
+            backend.bump('1:page')
+            os._exit(0 if fresh and backend.generation('1:page') == 2 else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert backend._connection() is parent_connection and backend.generation('1:page') == 2
+
+def test_writes_invalidate_the_pages_they_change(user, client_for):
+    client = client_for(user)
+
+    client.get('/dashboard')
+    generations = {name: user_cache.generation(user, name) for name in user_cache.names}
+    assert client.post('/books/add', data={'title': 'Cache Busting Dragons'}).status_code == 302
+    assert b'Cache Busting Dragons' in client.get('/dashboard').data
+    assert user_cache.generation(user, 'books') != generations['books']
+
+    for path, changed in (('/study/start', ('dashboard', 'study', 'active')),
+                          ('/study/stop', ('dashboard', 'study', 'study_stats', 'stats', 'active'))):
+        client.get('/dashboard')
+        client.get('/study/current')
+        before = {name: user_cache.generation(user, name) for name in changed}
+        assert client.post(path, data={'subject': 'maths'}).status_code == 200
+        assert all(user_cache.generation(user, name) != before[name] for name in changed)
+        assert client.get('/study/current').get_json()['active'] == (path == '/study/start')
+
+def test_a_reused_user_id_does_not_serve_a_cached_missing_user():
+    with app.app_context():
+        db.create_all()
+        if User.query.filter_by(email='demo@example.com').first():
+            pytest.skip('demo user already exists in this database')
+        next_id = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    with app.test_request_context():
+        # A request with a cookie for a deleted account caches "no such user" for the id
+        assert load_user(str(next_id)) is None
+
+    client = app.test_client()
+    assert client.post('/demo-login').get_json()['success']
+    with app.app_context():
+        assert User.query.filter_by(email='demo@example.com').one().id == next_id
+    assert client.get('/dashboard').status_code == 200
+    assert identity_cache.get_or_load(next_id, 'identity', lambda: None).email == 'demo@example.com'
+
+def test_admin_changes_reach_the_next_request(make_user, client_for):
+    admin = client_for(make_user('Head Teacher', is_admin=True))
+    target_id = make_user('Helper', is_admin=True)
+    target = client_for(target_id)
+
+    assert target.get('/admin').status_code == 200           # caches the identity as an admin
+    assert admin.post(f'/admin/toggle-admin/{target_id}').status_code == 302
+    assert target.get('/admin').headers['Location'].endswith('/dashboard')
+
+    assert admin.post(f'/admin/toggle-admin/{target_id}').status_code == 302
+    assert target.get('/admin').status_code == 200
+
+def test_admin_changes_reach_other_workers(make_user, client_for, tmp_path, monkeypatch):
+    backend_path = str(tmp_path / 'shared.db')
+    monkeypatch.setattr(app_module, 'identity_cache',
+                        UserCache(('identity',), backend=SQLiteCacheBackend(backend_path), ttl=300))
+    other_worker = UserCache(('identity',), backend=SQLiteCacheBackend(backend_path), ttl=300)
+    admin = client_for(make_user('Head Teacher', is_admin=True))
+    target_id = make_user('Helper', is_admin=True)
+
+    with app.app_context():
+        load = lambda: load_user_snapshot(target_id)
+        assert other_worker.get_or_load(target_id, 'identity', load).is_admin
+        assert admin.post(f'/admin/toggle-admin/{target_id}').status_code == 302
+        assert not other_worker.get_or_load(target_id, 'identity', load).is_admin